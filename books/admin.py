@@ -1,5 +1,7 @@
+from django import forms
 from django.contrib import admin
 from .models import Book, Chapter, BookSource, ScrapingTask, ScheduledTask, ScheduledTaskLog
+from .storage import load_content, save_content
 
 
 @admin.register(Book)
@@ -7,9 +9,9 @@ class BookAdmin(admin.ModelAdmin):
     list_display = ['name', 'author', 'kind', 'get_chapter_count', 'enabled', 'is_local', 'from_source', 'created_at']
     search_fields = ['name', 'author', 'book_url']
     list_filter = ['kind', 'enabled', 'is_local', 'from_source']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['chapter_count', 'created_at', 'updated_at']
     fieldsets = [
-        ('基本信息', {'fields': ['name', 'author', 'kind', 'word_count']}),
+        ('基本信息', {'fields': ['name', 'author', 'kind', 'word_count', 'chapter_count']}),
         ('封面与简介', {'fields': ['cover_url', 'intro']}),
         ('URL信息', {'fields': ['book_url', 'toc_url']}),
         ('状态控制', {'fields': ['enabled', 'is_local', 'from_source']}),
@@ -17,13 +19,33 @@ class BookAdmin(admin.ModelAdmin):
     ]
 
 
+class ChapterAdminForm(forms.ModelForm):
+    """正文不在 Chapter 表中，通过 books.storage 读写"""
+    content = forms.CharField(label='正文内容', widget=forms.Textarea, required=False)
+
+    class Meta:
+        model = Chapter
+        fields = ['book', 'title', 'chapter_url', 'chapter_index', 'is_vip']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['content'].initial = load_content(self.instance.pk)
+
+
 @admin.register(Chapter)
 class ChapterAdmin(admin.ModelAdmin):
+    form = ChapterAdminForm
     list_display = ['title', 'book', 'chapter_index', 'is_vip', 'created_at']
     search_fields = ['title', 'book__name']
     list_filter = ['book', 'is_vip']
     readonly_fields = ['created_at', 'updated_at']
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'content' in form.changed_data or not change:
+            save_content(obj.pk, form.cleaned_data.get('content', ''))
+
 
 class BookSourceAdmin(admin.ModelAdmin):
     list_display = ['name', 'url', 'group', 'source_type', 'enabled', 'status', 'created_at']
@@ -46,28 +68,24 @@ admin.site.register(BookSource, BookSourceAdmin)
 
 
 class ScrapingTaskAdmin(admin.ModelAdmin):
-    list_display = ['id', 'task_type', 'keyword', 'display_source', 'status', 'result_count', 'created_at']
+    list_display = ['id', 'task_type', 'keyword', 'display_source', 'status', 'result_count', 'worker', 'heartbeat_at', 'created_at']
     search_fields = ['keyword']
     list_filter = ['task_type', 'status', 'source']
-    readonly_fields = ['created_at', 'completed_at']
+    readonly_fields = ['created_at', 'completed_at', 'scheduled_task', 'worker', 'queued_at', 'started_at', 'heartbeat_at', 'attempts', 'metrics']
     actions = ['run_tasks']
     
     def display_source(self, obj):
         return obj.source.name if obj.source else '-'
     
     def run_tasks(self, request, queryset):
-        from books.scrapers.engine import ScrapingEngine
-        engine = ScrapingEngine()
+        from books.scrapers.worker import enqueue_task
         
         count = 0
         for task in queryset:
-            if task.status == 'pending':
-                import threading
-                thread = threading.Thread(target=engine.run_task, args=(task.id,))
-                thread.start()
+            if enqueue_task(task.id):
                 count += 1
         
-        self.message_user(request, f'已启动 {count} 个任务')
+        self.message_user(request, f'已将 {count} 个任务加入队列')
     
     display_source.short_description = '书源'
     display_source.admin_order_field = 'source__name'
@@ -85,7 +103,7 @@ class ScheduledTaskAdmin(admin.ModelAdmin):
     actions = ['enable_tasks', 'disable_tasks', 'run_now']
     fieldsets = [
         ('基本信息', {'fields': ['name', 'description', 'source', 'task_type', 'keyword']}),
-        ('执行计划', {'fields': ['interval_type', 'interval_seconds', 'cron_expression', 'start_time', 'end_time']}),
+        ('执行计划', {'fields': ['interval_type', 'interval_seconds', 'cron_expression', 'start_time', 'end_time', 'misfire_grace_time', 'coalesce']}),
         ('状态信息', {'fields': ['status', 'last_run_time', 'next_run_time', 'last_result_count', 'total_runs']}),
         ('时间信息', {'fields': ['created_at', 'updated_at']}),
     ]
@@ -119,9 +137,11 @@ class ScheduledTaskAdmin(admin.ModelAdmin):
 
     def run_now(self, request, queryset):
         from books.scrapers.scheduler import run_task_now
+        count = 0
         for task in queryset:
-            run_task_now(task.id)
-        self.message_user(request, f'已启动 {queryset.count()} 个任务')
+            if run_task_now(task.id):
+                count += 1
+        self.message_user(request, f'已将 {count} 个任务加入队列')
     run_now.short_description = '立即执行'
 
 
@@ -131,7 +151,7 @@ admin.site.register(ScheduledTask, ScheduledTaskAdmin)
 class ScheduledTaskLogAdmin(admin.ModelAdmin):
     list_display = ['scheduled_task', 'status', 'start_time', 'end_time', 'result_count']
     list_filter = ['status', 'scheduled_task']
-    readonly_fields = ['start_time', 'end_time']
+    readonly_fields = ['start_time', 'end_time', 'metrics']
     date_hierarchy = 'start_time'
 
 
@@ -7,4 +7,4 @@ class BooksConfig(AppConfig):
     verbose_name = '书籍管理'
 
     def ready(self):
-        pass
+        from . import signals  # noqa: F401
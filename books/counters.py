@@ -0,0 +1,81 @@
+"""
+冗余计数
+
+Book.chapter_count 保存书籍的章节数，阅读接口直接读取该字段，不再每次 COUNT。
+单条章节的增删由信号增减计数；批量写入（bulk_create 不触发信号）结束后按实际行数重算；
+定时对账任务修正其他途径（如直接执行 SQL）造成的偏差。
+
+Category.book_count 保存各分类的启用书籍数，书籍保存、删除时由信号按分类和启用状态的变化增减，
+QuerySet.update 等不触发信号的批量修改由对账任务修正。
+"""
+from typing import Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Book, Category, Chapter
+
+
+def _chapter_count_subquery():
+    return Coalesce(
+        Subquery(
+            Chapter.objects.filter(book=OuterRef('pk')).order_by().values('book')
+            .annotate(total=Count('id')).values('total')
+        ),
+        Value(0),
+    )
+
+
+def adjust_chapter_count(book_id: int, delta: int):
+    # 计数已有偏差时减到 0 为止，不触发 PositiveIntegerField 的 CHECK 约束
+    Book.objects.filter(pk=book_id).update(chapter_count=Greatest(F('chapter_count') + delta, 0))
+
+
+def refresh_chapter_count(book_id: int):
+    """按实际章节行数重算单本书的章节数"""
+    Book.objects.filter(pk=book_id).update(chapter_count=_chapter_count_subquery())
+
+
+def reconcile_chapter_counts() -> int:
+    """修正所有计数不一致的书籍，返回修正的书籍数"""
+    mismatched = Book.objects.annotate(actual=_chapter_count_subquery()).exclude(chapter_count=F('actual'))
+    book_ids = list(mismatched.values_list('pk', flat=True))
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).update(chapter_count=_chapter_count_subquery())
+    return len(book_ids)
+
+
+def adjust_category_count(name: str, delta: int):
+    if not name:
+        return
+    with transaction.atomic():
+        updated = Category.objects.filter(name=name).update(book_count=Greatest(F('book_count') + delta, 0))
+        if not updated and delta > 0:
+            Category.objects.get_or_create(name=name, defaults={'book_count': delta})
+
+
+def move_category(old: Optional[Tuple[str, bool]], new: Tuple[str, bool]):
+    """书籍的 (kind, enabled) 由 old 变为 new 时调整分类计数，old 为 None 表示新建"""
+    old_kind = old[0] if old and old[1] else ''
+    new_kind = new[0] if new[1] else ''
+    if old_kind != new_kind:
+        adjust_category_count(old_kind, -1)
+        adjust_category_count(new_kind, 1)
+
+
+def rebuild_categories() -> int:
+    """按启用书籍重新统计全部分类，返回计数有变化的分类数"""
+    actual = dict(
+        Book.objects.filter(enabled=True).exclude(kind='').order_by()
+        .values_list('kind').annotate(total=Count('id'))
+    )
+    changed = 0
+    with transaction.atomic():
+        for category in Category.objects.select_for_update():
+            total = actual.pop(category.name, 0)
+            if category.book_count != total:
+                Category.objects.filter(pk=category.pk).update(book_count=total)
+                changed += 1
+        Category.objects.bulk_create([Category(name=name, book_count=total) for name, total in actual.items()])
+    return changed + len(actual)
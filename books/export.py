@@ -0,0 +1,252 @@
+"""
+书籍导出
+
+将已入库的书籍导出为 TXT 或 EPUB。章节按序号分块迭代，边读边写入响应，
+EPUB 由 zipfile 直接写到只缓冲当前文件的输出流，内存占用与书籍大小无关。
+
+开启 EXPORT_CACHE_ENABLED 后，完整导出的文件同时保存到 EXPORT_CACHE_DIR，
+书籍或章节变化（章节数、章节/正文更新时间、书籍更新时间）后缓存自动失效。
+"""
+import hashlib
+import html
+import io
+import os
+import re
+import tempfile
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Max
+
+from .models import Book, Chapter
+from .storage import iter_book_contents
+
+EXPORT_FORMATS = {
+    'txt': 'text/plain; charset=utf-8',
+    'epub': 'application/epub+zip',
+}
+
+_BREAK_RE = re.compile(r'<br\s*/?>|</p\s*>|</div\s*>', re.IGNORECASE)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def html_to_paragraphs(content: str) -> List[str]:
+    """把抓取到的正文 HTML 转换为段落列表"""
+    text = html.unescape(_TAG_RE.sub('', _BREAK_RE.sub('\n', content or '')))
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+class _Pipe:
+    """
+    写入的数据由生成器取走的输出流
+
+    尚未取走的数据保存在缓冲区中，支持在缓冲区范围内 seek，zipfile 因此会把
+    CRC 和长度回填到本地文件头，而不是改用数据描述符。EPUB 阅读器按固定偏移
+    检查第一个文件 mimetype，它的本地文件头必须带有真实的 CRC 和长度。
+    每次 drain 都在完整写入一个文件之后调用，回填不会越过已取走的数据。
+    """
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.offset = 0
+
+    def write(self, data) -> int:
+        return self.buffer.write(data)
+
+    def tell(self) -> int:
+        return self.offset + self.buffer.tell()
+
+    def seek(self, position: int, whence: int = io.SEEK_SET) -> int:
+        if whence != io.SEEK_SET or position < self.offset:
+            raise OSError('只能在未取走的数据范围内 seek')
+        return self.offset + self.buffer.seek(position - self.offset)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = self.buffer.getvalue()
+        self.offset += len(data)
+        self.buffer = io.BytesIO()
+        return data
+
+
+def iter_txt(book: Book) -> Iterator[bytes]:
+    header = [book.name, f'作者：{book.author}']
+    intro = html_to_paragraphs(book.intro)
+    if intro:
+        header += ['', '简介：'] + intro
+    yield ('\n'.join(header) + '\n\n').encode('utf-8')
+
+    for title, _, _, content in iter_book_contents(book.pk):
+        paragraphs = html_to_paragraphs(content)
+        yield ('\n'.join([title, ''] + ['　　' + p for p in paragraphs]) + '\n\n').encode('utf-8')
+
+
+def _xhtml(title: str, paragraphs: List[str]) -> str:
+    body = ''.join(f'<p>{escape(p)}</p>' for p in paragraphs)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml">'
+        f'<head><title>{escape(title)}</title></head>'
+        f'<body><h2>{escape(title)}</h2>{body}</body></html>'
+    )
+
+
+def _content_opf(book: Book, identifier: str, chapters: List[Tuple[str, str]]) -> str:
+    manifest = ''.join(
+        f'<item id="{name}" href="{name}.xhtml" media-type="application/xhtml+xml"/>' for name, _ in chapters
+    )
+    spine = ''.join(f'<itemref idref="{name}"/>' for name, _ in chapters)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="bookid" version="2.0">'
+        '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+        f'<dc:identifier id="bookid">{identifier}</dc:identifier>'
+        f'<dc:title>{escape(book.name)}</dc:title>'
+        f'<dc:creator>{escape(book.author)}</dc:creator>'
+        '<dc:language>zh</dc:language>'
+        f'<dc:description>{escape(book.intro)}</dc:description>'
+        '</metadata>'
+        f'<manifest><item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>{manifest}</manifest>'
+        f'<spine toc="ncx">{spine}</spine>'
+        '</package>'
+    )
+
+
+def _toc_ncx(book: Book, identifier: str, chapters: List[Tuple[str, str]]) -> str:
+    points = ''.join(
+        f'<navPoint id="nav{i}" playOrder="{i}"><navLabel><text>{escape(title)}</text></navLabel>'
+        f'<content src="{name}.xhtml"/></navPoint>'
+        for i, (name, title) in enumerate(chapters, 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">'
+        f'<head><meta name="dtb:uid" content="{identifier}"/></head>'
+        f'<docTitle><text>{escape(book.name)}</text></docTitle>'
+        f'<navMap>{points}</navMap>'
+        '</ncx>'
+    )
+
+
+def iter_epub(book: Book) -> Iterator[bytes]:
+    """
+    逐章生成 EPUB 2 文件
+
+    章节文件先写入，content.opf 与 toc.ncx 需要完整章节列表，放在最后写入；
+    常驻内存的只有章节标题。
+    """
+    identifier = f'urn:uuid:{uuid.uuid5(uuid.NAMESPACE_URL, book.book_url)}'
+    pipe = _Pipe()
+    chapters = []
+
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as epub:
+        # mimetype 必须是第一个且不压缩的文件
+        epub.writestr(zipfile.ZipInfo('mimetype'), 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        epub.writestr('META-INF/container.xml', (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+            '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>'
+            '</container>'
+        ))
+        yield pipe.drain()
+
+        for i, (title, _, _, content) in enumerate(iter_book_contents(book.pk), 1):
+            name = f'chapter{i:05d}'
+            epub.writestr(f'OEBPS/{name}.xhtml', _xhtml(title, html_to_paragraphs(content)))
+            chapters.append((name, title))
+            yield pipe.drain()
+
+        epub.writestr('OEBPS/content.opf', _content_opf(book, identifier, chapters))
+        epub.writestr('OEBPS/toc.ncx', _toc_ncx(book, identifier, chapters))
+    yield pipe.drain()
+
+
+EXPORTERS = {
+    'txt': iter_txt,
+    'epub': iter_epub,
+}
+
+
+def export_filename(book: Book, fmt: str) -> str:
+    return f'{book.name}.{fmt}'
+
+
+def _cache_dir() -> Optional[Path]:
+    if not getattr(settings, 'EXPORT_CACHE_ENABLED', False):
+        return None
+    return Path(getattr(settings, 'EXPORT_CACHE_DIR', Path(tempfile.gettempdir()) / 'novel_export_cache'))
+
+
+def export_stamp(book: Book) -> str:
+    """书籍内容的版本标识，任一章节或正文变化都会改变"""
+    latest = Chapter.objects.filter(book=book).aggregate(
+        chapter=Max('updated_at'),
+        content=Max('body__updated_at'),
+    )
+    raw = f"{book.chapter_count}|{book.updated_at}|{latest['chapter']}|{latest['content']}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def cached_export_path(book: Book, fmt: str, stamp: str) -> Optional[Path]:
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return None
+    return cache_dir / str(book.pk) / f'{stamp}.{fmt}'
+
+
+def get_cached_export(book: Book, fmt: str) -> Tuple[Optional[Path], Optional[Path]]:
+    """
+    返回 (cached_path, target_path)
+
+    cached_path 为可直接使用的缓存文件；未开启缓存时两者都为 None，
+    缓存失效时 cached_path 为 None，target_path 为应写入的新缓存路径。
+    """
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return None, None
+    path = cached_export_path(book, fmt, export_stamp(book))
+    return (path if path.exists() else None), path
+
+
+def iter_export(book: Book, fmt: str, cache_path: Optional[Path] = None) -> Iterator[bytes]:
+    """
+    生成导出内容；指定 cache_path 时同时写入缓存文件
+
+    缓存先写入临时文件，完整生成后才替换为正式文件，
+    客户端中途断开不会留下不完整的缓存。
+    """
+    chunks = EXPORTERS[fmt](book)
+    if cache_path is None:
+        yield from chunks
+        return
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        for stale in cache_path.parent.glob(f'*.{fmt}'):
+            stale.unlink(missing_ok=True)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def build_export(book: Book, fmt: str) -> Optional[Path]:
+    """预先生成导出缓存，返回缓存文件路径；未开启缓存时返回 None"""
+    cached, target = get_cached_export(book, fmt)
+    if target is None:
+        return None
+    if cached is None:
+        for _ in iter_export(book, fmt, target):
+            pass
+    return target
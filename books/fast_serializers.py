@@ -0,0 +1,49 @@
+"""
+阅读接口的快速序列化
+
+热点接口直接用 .values() 取出所需列，按阅读APP的字段名组装字典，
+跳过 DRF 序列化器逐字段的处理。字段和顺序与 books.serializers 中对应的序列化器保持一致，
+可用 python manage.py benchmark_serializers 校验输出逐字节相同。
+"""
+from typing import Any, Dict, Iterable, List
+
+# (数据库字段, 输出字段)
+BOOK_LIST_FIELDS = [
+    ('name', 'name'),
+    ('author', 'author'),
+    ('kind', 'kind'),
+    ('cover_url', 'coverUrl'),
+    ('intro', 'intro'),
+    ('last_chapter', 'lastChapter'),
+    ('book_url', 'bookUrl'),
+    ('toc_url', 'tocUrl'),
+]
+
+BOOK_DETAIL_FIELDS = [
+    ('name', 'name'),
+    ('author', 'author'),
+    ('kind', 'kind'),
+    ('cover_url', 'coverUrl'),
+    ('intro', 'intro'),
+    ('last_chapter', 'lastChapter'),
+    ('word_count', 'wordCount'),
+    ('toc_url', 'tocUrl'),
+]
+
+BOOK_LIST_COLUMNS = [column for column, _ in BOOK_LIST_FIELDS]
+BOOK_DETAIL_COLUMNS = [column for column, _ in BOOK_DETAIL_FIELDS]
+
+
+def _text(value):
+    # 与 serializers.CharField 一致：None 保持为 None，其余转为字符串
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def book_list_data(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """把 values(*BOOK_LIST_COLUMNS) 的结果转换为 BookListSerializer 的输出格式"""
+    return [{key: _text(row[column]) for column, key in BOOK_LIST_FIELDS} for row in rows]
+
+
+def book_detail_data(row: Dict[str, Any]) -> Dict[str, Any]:
+    """把 values(*BOOK_DETAIL_COLUMNS) 的结果转换为 BookDetailSerializer 的输出格式"""
+    return {key: _text(row[column]) for column, key in BOOK_DETAIL_FIELDS}
@@ -0,0 +1,80 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from books.fast_serializers import BOOK_DETAIL_COLUMNS, BOOK_LIST_COLUMNS, book_detail_data, book_list_data
+from books.models import Book
+from books.renderers import FastJSONRenderer, orjson
+from books.search import search_books
+from books.serializers import BookDetailSerializer, BookListSerializer, ChapterSerializer
+from books.toc import build_chapters_json, render_toc
+
+
+class Command(BaseCommand):
+    help = '对比阅读接口的快速序列化与 DRF 序列化器的输出和耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--book', type=int, help='用于详情和目录对比的书籍ID，默认章节最多的书籍')
+        parser.add_argument('--iterations', type=int, default=20, help='每项重复次数')
+
+    def handle(self, *args, **options):
+        book = Book.objects.filter(pk=options['book']).first() if options['book'] else \
+            Book.objects.filter(enabled=True).order_by('-chapter_count').first()
+        if book is None:
+            raise CommandError('没有可用于对比的书籍')
+
+        key = book.name[:2]
+        drf_renderer = JSONRenderer()
+        fast_renderer = FastJSONRenderer()
+
+        def listing(data):
+            return {'code': 0, 'msg': 'success', 'data': data, 'next': None}
+
+        def drf_toc():
+            chapters = ChapterSerializer(book.chapters.all(), many=True).data
+            return drf_renderer.render({'bookUrl': book.book_url, 'chapters': chapters})
+
+        def explore_rows():
+            return Book.objects.filter(enabled=True).order_by('-updated_at', '-id')
+
+        cases = [
+            ('search',
+             lambda: drf_renderer.render(listing(BookListSerializer(search_books(key, 20)[0], many=True).data)),
+             lambda: fast_renderer.render(listing(book_list_data(search_books(key, 20, fields=BOOK_LIST_COLUMNS)[0])))),
+            ('explore',
+             lambda: drf_renderer.render(listing(BookListSerializer(explore_rows()[:20], many=True).data)),
+             lambda: fast_renderer.render(listing(book_list_data(explore_rows().values(*BOOK_LIST_COLUMNS)[:20])))),
+            ('detail',
+             lambda: drf_renderer.render(BookDetailSerializer(Book.objects.get(pk=book.pk)).data),
+             lambda: fast_renderer.render(book_detail_data(Book.objects.values(*BOOK_DETAIL_COLUMNS).get(pk=book.pk)))),
+            ('toc',
+             drf_toc,
+             lambda: render_toc(book, build_chapters_json(book.pk)).encode('utf-8')),
+        ]
+
+        self.stdout.write(f'书籍: {book.name}（{book.chapter_count} 章），orjson: {"已安装" if orjson else "未安装"}')
+        mismatched = []
+        for name, drf, fast in cases:
+            expected, actual = drf(), fast()
+            identical = expected == actual
+            if not identical:
+                mismatched.append(name)
+            drf_time = self._time(drf, options['iterations'])
+            fast_time = self._time(fast, options['iterations'])
+            self.stdout.write(
+                f'{name:8s} {len(expected):>10d} 字节  一致: {"是" if identical else "否"}  '
+                f'DRF {drf_time * 1000:8.2f}ms  快速 {fast_time * 1000:8.2f}ms  '
+                f'提升 {drf_time / fast_time if fast_time else 0:5.1f}x'
+            )
+
+        if mismatched:
+            raise CommandError(f'输出不一致: {", ".join(mismatched)}')
+        self.stdout.write(self.style.SUCCESS('所有接口输出逐字节一致'))
+
+    @staticmethod
+    def _time(func, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - start) / iterations
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from books.export import EXPORT_FORMATS, build_export
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = '预先生成书籍导出缓存（需开启 EXPORT_CACHE_ENABLED）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('book_ids', nargs='*', type=int, help='书籍ID，不指定时导出所有启用的书籍')
+        parser.add_argument('--format', dest='formats', action='append', choices=list(EXPORT_FORMATS),
+                            help='导出格式，可重复指定，默认全部格式')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'EXPORT_CACHE_ENABLED', False):
+            self.stdout.write(self.style.WARNING('未开启 EXPORT_CACHE_ENABLED，无需预生成'))
+            return
+
+        books = Book.objects.filter(enabled=True)
+        if options['book_ids']:
+            books = books.filter(id__in=options['book_ids'])
+        formats = options['formats'] or list(EXPORT_FORMATS)
+
+        count = 0
+        for book in books.iterator():
+            for fmt in formats:
+                path = build_export(book, fmt)
+                self.stdout.write(f'{book.name}: {path}')
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'导出完成，共 {count} 个文件'))
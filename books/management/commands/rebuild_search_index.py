@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from books import search
+
+
+class Command(BaseCommand):
+    help = '重建书籍全文检索索引'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.WARNING('当前数据库不支持全文检索索引，搜索将使用普通查询'))
+            return
+
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'索引重建完成，共 {count} 本书籍'))
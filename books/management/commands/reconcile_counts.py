@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from books.counters import rebuild_categories, reconcile_chapter_counts
+
+
+class Command(BaseCommand):
+    help = '按实际数据修正书籍章节数和分类书籍数'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_chapter_counts()
+        self.stdout.write(self.style.SUCCESS(f'章节数对账完成，修正 {fixed} 本书籍'))
+        fixed = rebuild_categories()
+        self.stdout.write(self.style.SUCCESS(f'分类对账完成，修正 {fixed} 个分类'))
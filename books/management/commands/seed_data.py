@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from books.models import Book, Chapter
+from books.storage import save_content
 
 
 class Command(BaseCommand):
@@ -94,14 +95,14 @@ class Command(BaseCommand):
                 self.stdout.write(f'创建书籍: {book.name}')
             
             for i, chapter_data in enumerate(book_data['chapters']):
-                Chapter.objects.update_or_create(
+                chapter, _ = Chapter.objects.update_or_create(
                     book=book,
                     chapter_url=f'/chapter/{book.id}/{i+1}',
                     defaults={
                         'title': chapter_data['title'],
                         'chapter_index': i + 1,
-                        'content': chapter_data['content'],
                     }
                 )
+                save_content(chapter.pk, chapter_data['content'])
         
         self.stdout.write(self.style.SUCCESS(f'成功创建 {created_count} 本测试书籍，共 30 个章节'))
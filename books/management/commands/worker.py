@@ -0,0 +1,72 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from books.scrapers import worker
+
+
+class Command(BaseCommand):
+    help = '启动抓取任务 worker，从队列认领并执行任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='并行执行任务的进程数，默认2')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='队列为空时的轮询间隔（秒）')
+        parser.add_argument('--once', action='store_true', help='执行完队列中的任务后退出')
+        parser.add_argument('--no-scheduler', action='store_true', help='不在本进程中运行定时任务调度器')
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        poll_interval = options['poll_interval']
+        once = options['once']
+
+        with_scheduler = not options['no_scheduler'] and not once
+        stop_event = multiprocessing.Event()
+        # 信号处理函数只记录标志，由主循环设置 stop_event：
+        # 主循环可能正持有 stop_event 的内部锁，在信号处理函数中 set() 会死锁
+        stopping = []
+
+        def shutdown(signum, frame):
+            stopping.append(signum)
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        worker.requeue_stale_tasks()
+        # 子进程不能共用父进程的数据库连接
+        connections.close_all()
+
+        def start(index):
+            process = multiprocessing.Process(
+                target=worker.worker_process, args=(index, poll_interval, stop_event, once, with_scheduler and index == 0),
+                name=f'scraping-worker-{index}', daemon=False,
+            )
+            process.start()
+            return process
+
+        pool = [start(i) for i in range(processes)]
+        self.stdout.write(self.style.SUCCESS(f'已启动 {processes} 个 worker 进程'))
+
+        last_check = time.monotonic()
+        while any(p.is_alive() for p in pool):
+            if stopping and not stop_event.is_set():
+                self.stdout.write('正在停止 worker，等待当前任务执行完成...')
+                stop_event.set()
+
+            for i, process in enumerate(pool):
+                process.join(timeout=1)
+                if not process.is_alive() and not stop_event.is_set() and not once:
+                    self.stdout.write(self.style.WARNING(f'worker 进程 {process.name} 异常退出，正在重启'))
+                    connections.close_all()
+                    pool[i] = start(i)
+
+            if time.monotonic() - last_check >= worker.HEARTBEAT_INTERVAL:
+                last_check = time.monotonic()
+                try:
+                    worker.requeue_stale_tasks()
+                finally:
+                    connections.close_all()
+
+        self.stdout.write('worker 已停止')
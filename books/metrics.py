@@ -0,0 +1,408 @@
+"""
+进程内运行指标
+
+计数器和直方图保存在进程内存中，每个指标一把锁，记录一次只需加锁累加，
+可在多线程的 Web 服务中直接使用。/api/metrics 以 Prometheus 文本格式输出。
+
+多进程部署（多个 worker 进程、多个容器共享数据目录）时，每个进程每隔
+METRICS_FLUSH_INTERVAL 秒把自己的指标快照写入 METRICS_DIR，输出时合并所有进程的快照；
+超过 METRICS_SNAPSHOT_TTL 秒未更新的快照（进程已退出）会并入归档文件，计数器总数不会下降。
+fork 出的子进程会清空从父进程继承的数值，避免重复计数。
+"""
+import bisect
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 10
+DEFAULT_SNAPSHOT_TTL = 300
+# 已退出进程的计数并入该文件，合并后的计数器不会因进程退出而下降
+ARCHIVE_FILE = 'archive.json'
+ARCHIVE_LOCK = 'archive.lock'
+ARCHIVE_LOCK_TIMEOUT = 60
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PARSE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} 需要标签 {self.labelnames}')
+        return tuple(str(label) for label in labels)
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            samples = [[list(key), self._copy(value)] for key, value in self._values.items()]
+        return {'type': self.type, 'help': self.documentation, 'labelnames': list(self.labelnames), 'samples': samples}
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        registry.ensure_flusher()
+
+
+class Histogram(Metric):
+    """累计直方图，样本值为 [各桶计数..., 总和, 样本数]"""
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+        registry.ensure_flusher()
+
+    def snapshot(self) -> Dict[str, object]:
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+
+class CallbackCounter(Metric):
+    """
+    取值来自回调函数的计数器，用于暴露已有的统计（例如缓存命中数）
+
+    回调返回 {标签值元组: 数值}。
+    """
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def snapshot(self) -> Dict[str, object]:
+        try:
+            samples = [[list(labels), value] for labels, value in self.callback().items()]
+        except Exception as e:
+            logger.error(f"读取指标 {self.name} 失败: {e}")
+            samples = []
+        return {'type': self.type, 'help': self.documentation, 'labelnames': list(self.labelnames), 'samples': samples}
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self._flusher_pid: Optional[int] = None
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback_counter(self, name: str, documentation: str, labelnames: Sequence[str],
+                         callback: Callable[[], Dict[Tuple[str, ...], float]]) -> CallbackCounter:
+        return self.register(CallbackCounter(name, documentation, labelnames, callback))
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def reset(self):
+        """fork 后在子进程中调用：清空继承的数值，重新启动快照线程"""
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher_pid = None
+        for metric in self._metrics.values():
+            metric.reset()
+
+    # 多进程快照
+
+    @property
+    def directory(self) -> Optional[Path]:
+        directory = getattr(settings, 'METRICS_DIR', None)
+        return Path(directory) if directory else None
+
+    def _snapshot_path(self) -> Path:
+        return self.directory / f'{socket.gethostname()}-{os.getpid()}.json'
+
+    def ensure_flusher(self):
+        """首次记录指标时启动快照线程，未配置 METRICS_DIR 时不启动"""
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._flush_lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+            if self.directory is None:
+                return
+            thread = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            thread.start()
+
+    def _flush_loop(self):
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def flush(self):
+        """把当前进程的指标写入快照文件"""
+        directory = self.directory
+        if directory is None:
+            return
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._write_json(self._snapshot_path(), self.snapshot())
+        except OSError as e:
+            logger.warning(f"写入指标快照失败: {e}")
+
+    def _write_json(self, path: Path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _archive(self, stale: List[Path]):
+        """
+        把已退出进程的快照并入归档文件后删除
+
+        直接删除会让合并后的计数器变小，Prometheus 会误判为计数器重置。
+        归档由锁文件保证同一时间只有一个进程在写；拿不到锁时本次跳过，下次输出时再处理。
+        """
+        directory = self.directory
+        lock_path = directory / ARCHIVE_LOCK
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                # 持有锁的进程异常退出时锁文件会残留
+                if time.time() - lock_path.stat().st_mtime > ARCHIVE_LOCK_TIMEOUT:
+                    lock_path.unlink()
+            except OSError:
+                pass
+            return
+        except OSError as e:
+            logger.warning(f"归档指标快照失败: {e}")
+            return
+        os.close(fd)
+        try:
+            archive_path = directory / ARCHIVE_FILE
+            try:
+                with open(archive_path, encoding='utf-8') as f:
+                    archive = json.load(f)
+            except (OSError, ValueError):
+                archive = {}
+            merged = []
+            for path in stale:
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        _merge(archive, json.load(f))
+                except FileNotFoundError:
+                    continue
+                except (OSError, ValueError):
+                    pass
+                merged.append(path)
+            self._write_json(archive_path, archive)
+            for path in merged:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+        except OSError as e:
+            logger.warning(f"归档指标快照失败: {e}")
+        finally:
+            try:
+                lock_path.unlink()
+            except OSError:
+                pass
+
+    def _other_snapshots(self) -> Iterable[Dict[str, Dict[str, object]]]:
+        directory = self.directory
+        if directory is None or not directory.is_dir():
+            return
+        own = self._snapshot_path().name
+        ttl = getattr(settings, 'METRICS_SNAPSHOT_TTL', DEFAULT_SNAPSHOT_TTL)
+        now = time.time()
+        stale = []
+        for path in directory.glob('*.json'):
+            if path.name == own:
+                continue
+            try:
+                if path.name != ARCHIVE_FILE and now - path.stat().st_mtime > ttl:
+                    stale.append(path)
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+        if not stale:
+            return
+        # 上面输出的是归档前的归档文件，这些快照在归档前先读出并计入本次输出
+        stale_data = []
+        for path in stale:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    stale_data.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        self._archive(stale)
+        yield from stale_data
+
+    def collect(self) -> Dict[str, Dict[str, object]]:
+        """合并当前进程、其他进程快照以及已退出进程归档中的指标"""
+        merged = self.snapshot()
+        for other in self._other_snapshots():
+            _merge(merged, other)
+        return merged
+
+
+def _merge(target: Dict[str, Dict[str, object]], other: Dict[str, Dict[str, object]]):
+    """把 other 中的指标累加到 target，标签相同的样本相加"""
+    for name, data in other.items():
+        current = target.get(name)
+        if current is None:
+            target[name] = data
+            continue
+        if current['type'] != data['type'] or data.get('buckets') != current.get('buckets'):
+            continue
+        samples = {tuple(labels): value for labels, value in current['samples']}
+        for labels, value in data['samples']:
+            labels = tuple(labels)
+            existing = samples.get(labels)
+            if existing is None:
+                samples[labels] = value
+            elif isinstance(existing, list):
+                samples[labels] = [a + b for a, b in zip(existing, value)]
+            else:
+                samples[labels] = existing + value
+        current['samples'] = [[list(labels), value] for labels, value in samples.items()]
+
+
+registry = Registry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.reset)
+
+
+def render(metrics: Dict[str, Dict[str, object]], extra_lines: Iterable[str] = ()) -> str:
+    """输出 Prometheus 文本格式（0.0.4）"""
+    lines: List[str] = []
+    for name in sorted(metrics):
+        data = metrics[name]
+        labelnames = data['labelnames']
+        lines.append(f'# HELP {name} {data["help"]}')
+        lines.append(f'# TYPE {name} {data["type"]}')
+        for labels, value in sorted(data['samples'], key=lambda sample: sample[0]):
+            if data['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(data['buckets'] + [float('inf')], value[:-2] + [0]):
+                    cumulative += count
+                    if bound == float('inf'):
+                        cumulative = value[-1]
+                    lines.append(f'{name}_bucket{_format_labels(labelnames, labels, ("le", _format_value(bound)))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labelnames, labels)} {_format_value(value[-2])}')
+                lines.append(f'{name}_count{_format_labels(labelnames, labels)} {value[-1]}')
+            else:
+                lines.append(f'{name}{_format_labels(labelnames, labels)} {_format_value(value)}')
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
+
+
+def gauge_lines(name: str, documentation: str, samples: Dict[Tuple[Tuple[str, str], ...], float]) -> List[str]:
+    """生成按需计算的 gauge（例如队列长度），不经过进程快照"""
+    lines = [f'# HELP {name} {documentation}', f'# TYPE {name} gauge']
+    for labels, value in samples.items():
+        names = [label for label, _ in labels]
+        values = [value for _, value in labels]
+        lines.append(f'{name}{_format_labels(names, values)} {_format_value(value)}')
+    return lines
+
+
+# HTTP 接口
+
+HTTP_REQUESTS = registry.counter(
+    'http_requests_total', 'HTTP 请求数', ('view', 'method', 'status'))
+HTTP_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'HTTP 请求处理耗时（秒）', ('view', 'method'))
+HTTP_DB_QUERIES = registry.histogram(
+    'http_request_db_queries', '每个 HTTP 请求执行的数据库查询数', ('view',), QUERY_COUNT_BUCKETS)
+
+# 抓取
+
+SCRAPER_REQUESTS = registry.counter(
+    'scraper_requests_total', '抓取请求数', ('source',))
+SCRAPER_ERRORS = registry.counter(
+    'scraper_request_errors_total', '抓取请求失败数（4xx/5xx 和网络错误）', ('source',))
+SCRAPER_LATENCY = registry.histogram(
+    'scraper_request_duration_seconds', '抓取请求耗时（秒）', ('source',))
+RULE_PARSE_LATENCY = registry.histogram(
+    'scraper_rule_parse_seconds', '单个规则步骤的解析耗时（秒），document 为构建文档树', ('type',), PARSE_BUCKETS)
+HTTP_CACHE_LOOKUPS = registry.counter(
+    'scraper_http_cache_total', '抓取条件请求缓存的使用情况，hit 为复用了缓存的解析结果', ('result',))
@@ -0,0 +1,40 @@
+import time
+
+from django.db import connection
+
+from . import metrics
+
+# 其他方法统一记为 other，避免任意方法名产生大量标签组合
+KNOWN_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class MetricsMiddleware:
+    """
+    记录每个请求的处理耗时、响应状态和数据库查询数
+
+    按 URL 名称（未匹配到路由时为 unmatched）分组，避免把书籍ID等路径参数带入标签。
+    应放在 MIDDLEWARE 的第一位，耗时包含其他中间件。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        seconds = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else '') or 'unmatched'
+        method = request.method if request.method in KNOWN_METHODS else 'other'
+        metrics.HTTP_LATENCY.observe(seconds, view, method)
+        metrics.HTTP_REQUESTS.inc(view, method, str(response.status_code))
+        metrics.HTTP_DB_QUERIES.observe(queries[0], view)
+        return response
@@ -0,0 +1,56 @@
+import re
+
+from django.db import migrations
+
+FTS_TABLE = 'books_book_fts'
+
+# 分词函数在此固定一份，不引用 books.search：之后调整分词规则不影响这次历史迁移，
+# 需要按新规则重建时执行 python manage.py rebuild_search_index
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_TOKEN_RE = re.compile(f'([{_CJK}]+)|([^\\W_{_CJK}]+)')
+
+
+def tokenize(text):
+    tokens = []
+    for match in _TOKEN_RE.finditer(text or ''):
+        cjk, word = match.groups()
+        if cjk and len(cjk) > 1:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            tokens.append(cjk[-1])
+        else:
+            tokens.append(cjk or word.lower())
+    return ' '.join(tokens)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    Book = apps.get_model('books', 'Book')
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(name, author, tokenize = 'unicode61')"
+    )
+    rows = [
+        (book_id, tokenize(name), tokenize(author))
+        for book_id, name, author in Book.objects.values_list('id', 'name', 'author')
+    ]
+    if rows:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {FTS_TABLE}(rowid, name, author) VALUES (%s, %s, %s)', rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_booksource_explore_rule_booksource_explore_url'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookToc',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='toc_cache', serialize=False, to='books.book')),
+                ('chapters_json', models.TextField(verbose_name='章节列表JSON')),
+                ('etag', models.CharField(max_length=64, verbose_name='ETag')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '目录缓存',
+                'verbose_name_plural': '目录缓存',
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:15
+
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+ZLIB_LEVEL = 6
+
+
+# 压缩函数在此固定一份，不引用 books.storage：之后修改存储格式不影响这次历史迁移。
+# 迁移统一使用 zlib，不依赖可选的 zstandard。
+def compress(text):
+    return 'zlib', zlib.compress(text.encode('utf-8'), ZLIB_LEVEL)
+
+
+def decompress(codec, data):
+    data = bytes(data)
+    if codec == 'zstd':
+        import zstandard
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == 'zlib':
+        raw = zlib.decompress(data)
+    else:
+        raw = data
+    return raw.decode('utf-8')
+
+
+def move_content_out(apps, schema_editor):
+    Chapter = apps.get_model('books', 'Chapter')
+    ChapterContent = apps.get_model('books', 'ChapterContent')
+    rows = []
+    for chapter_id, content in Chapter.objects.exclude(content='').values_list('id', 'content').iterator(chunk_size=BATCH_SIZE):
+        codec, data = compress(content)
+        rows.append(ChapterContent(chapter_id=chapter_id, codec=codec, data=data, size=len(content)))
+        if len(rows) >= BATCH_SIZE:
+            ChapterContent.objects.bulk_create(rows)
+            rows = []
+    if rows:
+        ChapterContent.objects.bulk_create(rows)
+
+
+def move_content_back(apps, schema_editor):
+    Chapter = apps.get_model('books', 'Chapter')
+    ChapterContent = apps.get_model('books', 'ChapterContent')
+    for chapter_id, codec, data in ChapterContent.objects.values_list('chapter_id', 'codec', 'data').iterator(chunk_size=BATCH_SIZE):
+        Chapter.objects.filter(pk=chapter_id).update(content=decompress(codec, data))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_book_toc'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChapterContent',
+            fields=[
+                ('chapter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='body', serialize=False, to='books.chapter')),
+                ('codec', models.CharField(choices=[('zlib', 'zlib'), ('zstd', 'zstd'), ('raw', '未压缩')], default='zlib', max_length=10, verbose_name='压缩格式')),
+                ('data', models.BinaryField(verbose_name='正文数据')),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='正文字数')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '章节正文',
+                'verbose_name_plural': '章节正文',
+            },
+        ),
+        migrations.RunPython(move_content_out, move_content_back),
+        migrations.RemoveField(
+            model_name='chapter',
+            name='content',
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:17
+
+from django.db import migrations, models
+
+
+def fill_chapter_count(apps, schema_editor):
+    from django.db.models import Count, OuterRef, Subquery, Value
+    from django.db.models.functions import Coalesce
+
+    Book = apps.get_model('books', 'Book')
+    Chapter = apps.get_model('books', 'Chapter')
+    Book.objects.update(chapter_count=Coalesce(
+        Subquery(
+            Chapter.objects.filter(book=OuterRef('pk')).order_by().values('book')
+            .annotate(total=Count('id')).values('total')
+        ),
+        Value(0),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_chapter_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='chapter_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='章节数'),
+        ),
+        migrations.RunPython(fill_chapter_count, migrations.RunPython.noop),
+    ]
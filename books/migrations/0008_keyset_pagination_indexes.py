@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_book_chapter_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['enabled', '-updated_at', '-id'], name='book_explore_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledtask',
+            index=models.Index(fields=['-created_at', '-id'], name='scheduledtask_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scrapingtask',
+            index=models.Index(fields=['-created_at', '-id'], name='scrapingtask_created_idx'),
+        ),
+    ]
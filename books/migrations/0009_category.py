@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:21
+
+from django.db import migrations, models
+
+
+def fill_categories(apps, schema_editor):
+    from django.db.models import Count
+
+    Book = apps.get_model('books', 'Book')
+    Category = apps.get_model('books', 'Category')
+    counts = (
+        Book.objects.filter(enabled=True).exclude(kind='').order_by()
+        .values_list('kind').annotate(total=Count('id'))
+    )
+    Category.objects.bulk_create([Category(name=kind, book_count=total) for kind, total in counts])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='分类')),
+                ('book_count', models.PositiveIntegerField(default=0, verbose_name='书籍数')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': '分类',
+                'verbose_name_plural': '分类',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['enabled', 'kind', '-updated_at', '-id'], name='book_explore_kind_idx'),
+        ),
+        migrations.RunPython(fill_categories, migrations.RunPython.noop),
+    ]
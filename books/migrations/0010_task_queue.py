@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scrapingtask',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, verbose_name='执行次数'),
+        ),
+        migrations.AddField(
+            model_name='scrapingtask',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='心跳时间'),
+        ),
+        migrations.AddField(
+            model_name='scrapingtask',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='入队时间'),
+        ),
+        migrations.AddField(
+            model_name='scrapingtask',
+            name='scheduled_task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='runs', to='books.scheduledtask', verbose_name='定时任务'),
+        ),
+        migrations.AddField(
+            model_name='scrapingtask',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='开始时间'),
+        ),
+        migrations.AddField(
+            model_name='scrapingtask',
+            name='worker',
+            field=models.CharField(blank=True, max_length=100, verbose_name='执行进程'),
+        ),
+        migrations.AlterField(
+            model_name='scrapingtask',
+            name='status',
+            field=models.CharField(choices=[('pending', '等待中'), ('queued', '排队中'), ('running', '进行中'), ('completed', '已完成'), ('failed', '失败')], default='pending', max_length=20, verbose_name='状态'),
+        ),
+        migrations.AddIndex(
+            model_name='scrapingtask',
+            index=models.Index(fields=['status', 'queued_at', 'id'], name='scrapingtask_queue_idx'),
+        ),
+    ]
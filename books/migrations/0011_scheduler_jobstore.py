@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_task_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerJob',
+            fields=[
+                ('id', models.CharField(max_length=191, primary_key=True, serialize=False)),
+                ('next_run_time', models.FloatField(blank=True, db_index=True, null=True, verbose_name='下次执行时间戳')),
+                ('job_state', models.BinaryField()),
+            ],
+            options={
+                'verbose_name': '调度器任务',
+                'verbose_name_plural': '调度器任务',
+            },
+        ),
+        migrations.CreateModel(
+            name='SchedulerLock',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('owner', models.CharField(max_length=200, verbose_name='持有者')),
+                ('expires_at', models.DateTimeField(verbose_name='过期时间')),
+            ],
+            options={
+                'verbose_name': '调度器锁',
+                'verbose_name_plural': '调度器锁',
+            },
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='coalesce',
+            field=models.BooleanField(default=True, help_text='错过多次时只补执行一次', verbose_name='合并错过的执行'),
+        ),
+        migrations.AddField(
+            model_name='scheduledtask',
+            name='misfire_grace_time',
+            field=models.PositiveIntegerField(blank=True, default=600, help_text='调度器停机等原因错过执行时间后，在该时间内恢复仍会补执行；为空表示不限', null=True, verbose_name='错过执行宽限(秒)'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_scheduler_jobstore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledtasklog',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict, help_text='请求、解析、数据库写入等各阶段的耗时和计数', verbose_name='运行统计'),
+        ),
+        migrations.AddField(
+            model_name='scrapingtask',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict, help_text='请求、解析、数据库写入等各阶段的耗时和计数', verbose_name='运行统计'),
+        ),
+    ]
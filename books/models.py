@@ -14,6 +14,7 @@ class Book(models.Model):
     enabled = models.BooleanField("启用", default=True)
     is_local = models.BooleanField("本地书籍", default=True)
     from_source = models.CharField("来源书源", max_length=200, blank=True)
+    chapter_count = models.PositiveIntegerField("章节数", default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -24,14 +25,27 @@ class Book(models.Model):
             models.Index(fields=['name']),
             models.Index(fields=['author']),
             models.Index(fields=['book_url']),
+            models.Index(fields=['enabled', '-updated_at', '-id'], name='book_explore_idx'),
+            models.Index(fields=['enabled', 'kind', '-updated_at', '-id'], name='book_explore_kind_idx'),
         ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # chapter_count 只通过 books.counters 以 UPDATE 维护，
+        # 保存整个对象时跳过该字段，避免内存中的旧值覆盖批量写入后的计数
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'chapter_count'
+            ]
+        super().save(*args, **kwargs)
+
     def get_chapter_count(self):
-        return self.chapters.count()
+        return self.chapter_count
     get_chapter_count.short_description = "章节数"
+    get_chapter_count.admin_order_field = "chapter_count"
 
 
 class Chapter(models.Model):
@@ -40,7 +54,6 @@ class Chapter(models.Model):
     chapter_url = models.CharField("章节URL", max_length=500)
     chapter_index = models.IntegerField("章节序号")
     is_vip = models.BooleanField("VIP章节", default=False)
-    content = models.TextField("正文内容", blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -56,6 +69,61 @@ class Chapter(models.Model):
     def __str__(self):
         return f"{self.book.name} - {self.title}"
 
+    @property
+    def content(self):
+        """正文保存在 ChapterContent 中，每次访问都会查询一次"""
+        from .storage import load_content
+        return load_content(self.pk) if self.pk else ''
+
+
+class ChapterContent(models.Model):
+    """章节正文，压缩后与目录信息分表存放，读写请通过 books.storage"""
+    CODEC_CHOICES = [
+        ('zlib', 'zlib'),
+        ('zstd', 'zstd'),
+        ('raw', '未压缩'),
+    ]
+
+    chapter = models.OneToOneField(Chapter, on_delete=models.CASCADE, primary_key=True, related_name='body')
+    codec = models.CharField("压缩格式", max_length=10, choices=CODEC_CHOICES, default='zlib')
+    data = models.BinaryField("正文数据")
+    size = models.PositiveIntegerField("正文字数", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "章节正文"
+        verbose_name_plural = "章节正文"
+
+
+class BookToc(models.Model):
+    """预先序列化的目录，章节写入后重新生成"""
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='toc_cache')
+    chapters_json = models.TextField("章节列表JSON")
+    etag = models.CharField("ETag", max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "目录缓存"
+        verbose_name_plural = "目录缓存"
+
+    def __str__(self):
+        return f"{self.book_id} - {self.etag}"
+
+
+class Category(models.Model):
+    """分类及其启用书籍数，由书籍的保存、删除增量维护"""
+    name = models.CharField("分类", max_length=50, unique=True)
+    book_count = models.PositiveIntegerField("书籍数", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "分类"
+        verbose_name_plural = "分类"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
 
 class BookSource(models.Model):
     SOURCE_TYPE_CHOICES = [
@@ -125,6 +193,7 @@ class ScrapingTask(models.Model):
 
     STATUS_CHOICES = [
         ('pending', '等待中'),
+        ('queued', '排队中'),
         ('running', '进行中'),
         ('completed', '已完成'),
         ('failed', '失败'),
@@ -139,9 +208,23 @@ class ScrapingTask(models.Model):
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
     completed_at = models.DateTimeField('完成时间', null=True, blank=True)
 
+    # 由 worker 进程执行，见 books.scrapers.worker
+    scheduled_task = models.ForeignKey('ScheduledTask', on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='runs', verbose_name='定时任务')
+    worker = models.CharField('执行进程', max_length=100, blank=True)
+    queued_at = models.DateTimeField('入队时间', null=True, blank=True)
+    started_at = models.DateTimeField('开始时间', null=True, blank=True)
+    heartbeat_at = models.DateTimeField('心跳时间', null=True, blank=True)
+    attempts = models.PositiveIntegerField('执行次数', default=0)
+    metrics = models.JSONField('运行统计', default=dict, blank=True, help_text='请求、解析、数据库写入等各阶段的耗时和计数')
+
     class Meta:
         verbose_name = "抓取任务"
         verbose_name_plural = "抓取任务"
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='scrapingtask_created_idx'),
+            models.Index(fields=['status', 'queued_at', 'id'], name='scrapingtask_queue_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_task_type_display()} - {self.keyword or self.source}"
@@ -174,6 +257,12 @@ class ScheduledTask(models.Model):
     start_time = models.DateTimeField('开始时间', null=True, blank=True)
     end_time = models.DateTimeField('结束时间', null=True, blank=True)
 
+    misfire_grace_time = models.PositiveIntegerField(
+        '错过执行宽限(秒)', null=True, blank=True, default=600,
+        help_text='调度器停机等原因错过执行时间后，在该时间内恢复仍会补执行；为空表示不限'
+    )
+    coalesce = models.BooleanField('合并错过的执行', default=True, help_text='错过多次时只补执行一次')
+
     status = models.CharField('状态', max_length=20, choices=STATUS_CHOICES, default='active')
     last_run_time = models.DateTimeField('上次执行时间', null=True, blank=True)
     next_run_time = models.DateTimeField('下次执行时间', null=True, blank=True)
@@ -186,6 +275,9 @@ class ScheduledTask(models.Model):
     class Meta:
         verbose_name = '定时任务'
         verbose_name_plural = '定时任务'
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='scheduledtask_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -220,6 +312,7 @@ class ScheduledTaskLog(models.Model):
     end_time = models.DateTimeField('结束时间', null=True, blank=True)
     result_count = models.IntegerField('结果数量', default=0)
     error_message = models.TextField('错误信息', blank=True)
+    metrics = models.JSONField('运行统计', default=dict, blank=True, help_text='请求、解析、数据库写入等各阶段的耗时和计数')
 
     class Meta:
         verbose_name = '定时任务日志'
@@ -228,3 +321,31 @@ class ScheduledTaskLog(models.Model):
 
     def __str__(self):
         return f'{self.scheduled_task.name} - {self.start_time.strftime("%Y-%m-%d %H:%M:%S")}'
+
+
+class SchedulerJob(models.Model):
+    """APScheduler 任务持久化存储，重启后保留每个任务的下次执行时间"""
+    id = models.CharField(max_length=191, primary_key=True)
+    next_run_time = models.FloatField('下次执行时间戳', null=True, blank=True, db_index=True)
+    job_state = models.BinaryField()
+
+    class Meta:
+        verbose_name = '调度器任务'
+        verbose_name_plural = '调度器任务'
+
+    def __str__(self):
+        return self.id
+
+
+class SchedulerLock(models.Model):
+    """调度器主节点锁，同一时间只有持有锁的进程运行调度器"""
+    name = models.CharField(max_length=50, primary_key=True)
+    owner = models.CharField('持有者', max_length=200)
+    expires_at = models.DateTimeField('过期时间')
+
+    class Meta:
+        verbose_name = '调度器锁'
+        verbose_name_plural = '调度器锁'
+
+    def __str__(self):
+        return f'{self.name} ({self.owner})'
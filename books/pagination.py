@@ -0,0 +1,118 @@
+"""
+游标分页
+
+游标是对排序键（例如相关度得分和书籍ID、更新时间和ID）的 base64 编码，
+客户端只需原样回传上一页返回的 next 值。未传 cursor 时仍按 page 参数分页，
+兼容阅读APP的页码请求；传了 cursor 但无法解析时抛出 InvalidCursor，接口返回 400。
+"""
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """游标无法解析或与排序字段不匹配"""
+
+
+def encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Optional[List[Any]]:
+    """
+    解析游标，未传时返回 None，格式不正确时抛出 InvalidCursor
+
+    严格校验 base64 字符集：宽松解码会丢弃非法字符，全是标点的游标会被当成未传，
+    静默退回到按页码分页。
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.b64decode(cursor + '=' * (-len(cursor) % 4), altchars=b'-_', validate=True)
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or not values:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def _int_param(request, name: str, default: int) -> int:
+    try:
+        return int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_page(request) -> int:
+    return max(1, _int_param(request, 'page', 1))
+
+
+def get_page_size(request, default: int = DEFAULT_PAGE_SIZE) -> int:
+    """读取 page_size 参数，限制在 1 到 MAX_PAGE_SIZE 之间"""
+    return min(MAX_PAGE_SIZE, max(1, _int_param(request, 'page_size', default)))
+
+
+def _after_cursor(queryset, ordering: Sequence[str], values: List[Any]):
+    """
+    生成“排在游标之后”的过滤条件
+
+    ordering 为 ('-updated_at', '-id') 形式的排序字段，条件展开为
+    (a < x) OR (a = x AND b < y) ...，可以利用对应的联合索引。
+    """
+    model = queryset.model
+    condition = Q()
+    equal = Q()
+    for field_name, raw in zip(ordering, values):
+        descending = field_name.startswith('-')
+        name = field_name.lstrip('-')
+        value = model._meta.get_field(name).to_python(raw)
+        lookup = 'lt' if descending else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return queryset.filter(condition)
+
+
+def _cursor_value(value: Any) -> Any:
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def keyset_paginate(queryset, ordering: Sequence[str], request,
+                    default_page_size: int = DEFAULT_PAGE_SIZE) -> Tuple[list, Optional[str]]:
+    """
+    按 ordering 分页，返回 (items, next_cursor)
+
+    请求带 cursor 时从游标位置继续读取（keyset 分页，深翻页不再扫描丢弃前面的行），
+    游标无效时抛出 InvalidCursor；否则按 page 参数偏移。两种方式都会返回下一页的游标，最后一页为 None。
+    queryset 可以是 values() 查询，此时需包含 ordering 中的字段。
+    """
+    page_size = get_page_size(request, default_page_size)
+    queryset = queryset.order_by(*ordering)
+
+    values = decode_cursor(request.GET.get('cursor', ''))
+    if values is not None:
+        if len(values) != len(ordering):
+            raise InvalidCursor(request.GET['cursor'])
+        try:
+            queryset = _after_cursor(queryset, ordering, values)
+        except (ValidationError, TypeError, ValueError):
+            # 游标被篡改（类型不符、None 等），按无效游标处理，不抛出 500
+            raise InvalidCursor(request.GET['cursor'])
+        items = list(queryset[:page_size + 1])
+    else:
+        start = (get_page(request) - 1) * page_size
+        items = list(queryset[start:start + page_size + 1])
+
+    if len(items) <= page_size:
+        return items, None
+    items = items[:page_size]
+    last = items[-1]
+    get = last.get if isinstance(last, dict) else lambda name: getattr(last, name)
+    return items, encode_cursor([_cursor_value(get(f.lstrip('-'))) for f in ordering])
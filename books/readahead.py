@@ -0,0 +1,111 @@
+"""
+章节预读
+
+客户端读取第 N 章后通常会接着读 N+1 到 N+3 章。每次阅读时在后台线程中
+把后续几章的正文预先读入热点缓存；正文为空且书籍来自书源时，
+顺便通过 BookScraper 抓取正文并入库，之后的阅读请求只需查询内存。
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import BookSource, Chapter
+from .storage import content_cache, save_contents, warm_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_READ_AHEAD = 3
+DEFAULT_WORKERS = 2
+
+
+class ReadAhead:
+    def __init__(self, count: int = DEFAULT_READ_AHEAD, workers: int = DEFAULT_WORKERS):
+        self.count = count
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='readahead')
+        self._inflight = set()
+        self._scheduled = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, chapter: Chapter, include_current: bool = False):
+        """
+        读取 chapter 后调用，在后台预读其后的章节
+
+        include_current 为 True 时当前章节也一并处理（例如当前章节正文为空）。
+        查询后续章节也放在后台线程中执行，不占用阅读请求的时间。
+        """
+        if self.count <= 0:
+            return
+        with self._lock:
+            # 同一章节的预读还在排队时不重复提交
+            if chapter.pk in self._scheduled:
+                return
+            self._scheduled.add(chapter.pk)
+
+        current = (chapter.pk, chapter.chapter_url) if include_current else None
+        self._executor.submit(
+            self._run, chapter.pk, chapter.book_id, chapter.chapter_index, chapter.book.from_source, current,
+        )
+
+    def _run(self, origin: int, book_id: int, chapter_index: int, from_source: str, current):
+        try:
+            chapters = list(
+                Chapter.objects.filter(book_id=book_id, chapter_index__gt=chapter_index)
+                .order_by('chapter_index').values_list('id', 'chapter_url')[:self.count]
+            )
+            if current is not None:
+                chapters.insert(0, current)
+
+            with self._lock:
+                self._scheduled.discard(origin)
+                chapters = [(pk, url) for pk, url in chapters if pk not in self._inflight and pk not in content_cache]
+                self._inflight.update(pk for pk, _ in chapters)
+        except Exception as e:
+            with self._lock:
+                self._scheduled.discard(origin)
+            close_old_connections()
+            logger.error(f"预读章节失败: {e}")
+            return
+
+        if chapters:
+            self._warm(from_source, chapters)
+        else:
+            close_old_connections()
+
+    def _warm(self, from_source: str, chapters):
+        try:
+            loaded = warm_cache(pk for pk, _ in chapters)
+
+            missing = [(pk, url) for pk, url in chapters if pk not in loaded]
+            if missing and from_source:
+                self._fetch(from_source, missing)
+        except Exception as e:
+            logger.error(f"预读章节失败: {e}")
+        finally:
+            with self._lock:
+                self._inflight.difference_update(pk for pk, _ in chapters)
+            close_old_connections()
+
+    def _fetch(self, from_source: str, chapters):
+        """通过书源抓取缺失的正文并入库"""
+        from books.scrapers.engine import BookScraper
+
+        source = BookSource.objects.filter(name=from_source, enabled=True).first()
+        if source is None:
+            return
+
+        scraper = BookScraper(source)
+        fetched = {}
+        items = [{'id': chapter_id, 'chapter_url': chapter_url} for chapter_id, chapter_url in chapters]
+        for item, content in scraper.fetch_chapter_contents(items):
+            if content:
+                fetched[item['id']] = content
+        if fetched:
+            save_contents(fetched)
+            # 重新读取以带上数据库中的版本
+            warm_cache(fetched)
+
+
+read_ahead = ReadAhead(getattr(settings, 'READ_AHEAD_CHAPTERS', DEFAULT_READ_AHEAD))
@@ -0,0 +1,38 @@
+"""
+快速 JSON 渲染
+
+安装了 orjson 时用它序列化响应，输出与 DRF JSONRenderer 的默认配置
+（紧凑分隔符、不转义非 ASCII 字符、转义 \\u2028/\\u2029）逐字节一致；
+未安装 orjson、请求了缩进或遇到 orjson 不支持的数据时退回 JSONRenderer。
+
+浮点数在科学计数法下的写法与 json 模块不同（1e16 与 1e+16），
+因此只用于不含浮点数的阅读类接口，见 books.views 中的 renderer_classes。
+"""
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+if orjson is not None:
+    # datetime、Decimal 等交给 DRF 的 JSONEncoder 处理，保证格式与 DRF 一致
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_SUBCLASS | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+FAST_RENDERERS = [FastJSONRenderer, BrowsableAPIRenderer]
@@ -0,0 +1,83 @@
+"""
+共享 HTTP 连接池
+
+每个书源在进程内只保留一个 httpx.Client，所有抓取任务和定时任务复用
+其中的 keep-alive 连接，避免每次运行都重新握手。书源更新后自动重建客户端。
+"""
+import threading
+from typing import Dict, Tuple
+
+import httpx
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+KEEPALIVE_EXPIRY = 60
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def build_client(source_config) -> httpx.Client:
+    """按书源配置创建 httpx 客户端"""
+    config = source_config.config_json or {}
+    try:
+        pool_size = max(1, int(config.get('pool_size', DEFAULT_POOL_SIZE)))
+    except (TypeError, ValueError):
+        pool_size = DEFAULT_POOL_SIZE
+
+    headers = {'User-Agent': DEFAULT_USER_AGENT}
+    if source_config.header:
+        headers.update(source_config.header)
+
+    return httpx.Client(
+        headers=headers,
+        timeout=DEFAULT_TIMEOUT,
+        follow_redirects=True,
+        http2=bool(config.get('http2', True)) and HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+class ClientPool:
+    """进程级的书源客户端池，线程安全"""
+
+    def __init__(self):
+        self._clients: Dict[int, Tuple[object, httpx.Client]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, source_config) -> httpx.Client:
+        source_id = getattr(source_config, 'pk', None)
+        if source_id is None:
+            return build_client(source_config)
+
+        version = source_config.updated_at
+        with self._lock:
+            entry = self._clients.get(source_id)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            # 旧客户端可能仍被正在运行的任务使用，不主动关闭，由垃圾回收释放连接
+            client = build_client(source_config)
+            self._clients[source_id] = (version, client)
+            return client
+
+    def close_all(self):
+        with self._lock:
+            clients = [client for _, client in self._clients.values()]
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+client_pool = ClientPool()
+
+
+def get_client(source_config) -> httpx.Client:
+    return client_pool.get(source_config)
@@ -1,126 +1,203 @@
 import re
+import copy
+import posixpath
 import json
-import requests
+import time
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from lxml import etree, html as lxml_html
+from urllib.parse import parse_qs, urljoin, urlparse
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 
+from django.utils import timezone
+
+from .client import get_client
+from .httpcache import CacheEntry, HttpCache, body_hash
+from .ratelimit import parse_retry_after, positive_number, rate_limiter
+from .rules import CompiledRule, RuleStep, get_compiled_rule, rule_cache
+from . import runstats
+from .. import metrics as prometheus
+
 logger = logging.getLogger(__name__)
 
+# 单个书源同时下载章节正文的默认并发数，可通过 config_json.concurrency 覆盖
+DEFAULT_CONCURRENCY = 4
+
+# 遇到这些状态码时按主机退避后重试
+RETRY_STATUS_CODES = (429, 503)
+DEFAULT_MAX_RETRIES = 3
+
+# 任务执行过程中只写回这些字段：worker 的心跳线程同时在更新 heartbeat_at，
+# 整行保存会用认领时读到的旧值覆盖心跳，导致仍在运行的任务被判定超时并重新入队
+TASK_UPDATE_FIELDS = ['status', 'error_message', 'result_count']
+
+# 目录/正文翻页的最大页数
+DEFAULT_MAX_PAGES = 100
+
+
+def _record_parse(kind: str, started: float):
+    seconds = time.perf_counter() - started
+    prometheus.RULE_PARSE_LATENCY.observe(seconds, kind)
+    metrics = runstats.current_metrics()
+    if metrics is not None:
+        metrics.add_parse(kind, seconds)
+
 
 class JsoupParser:
     def __init__(self, html: str, base_url: str = ''):
         self.html = html
+        started = time.perf_counter()
         self.soup = BeautifulSoup(html, 'lxml')
+        _record_parse('document', started)
+        self.root = self.soup
         self.base_url = base_url
-
-    def parse(self, rule: str) -> List[Any]:
-        if not rule or not rule.strip():
+        self.context = None
+
+    def for_element(self, elem) -> 'JsoupParser':
+        """返回以 elem 为根节点的解析器，直接复用已解析的文档树"""
+        if not hasattr(elem, 'find_all'):
+            return type(self)(str(elem), self.base_url)
+        scoped = copy.copy(self)
+        scoped.context = elem
+        return scoped
+
+    def parse(self, rule) -> List[Any]:
+        compiled = get_compiled_rule(rule)
+        if not compiled:
             return []
 
-        parts = rule.split('@')
-        elements = [self.soup]
-
-        for i, part in enumerate(parts):
-            if not part or part.strip() == '':
-                continue
+        metrics = runstats.current_metrics()
+        if self.context is None:
+            elements = [self.root]
+            for step in compiled.steps:
+                elements = self._run_step(metrics, step, elements)
+            return elements
+
+        # 以节点为根时，首个步骤需要把节点自身也纳入匹配范围，
+        # 与把节点单独序列化再解析时的结果保持一致
+        elements = [self.context]
+        for i, step in enumerate(compiled.steps):
+            elements = self._run_step(metrics, step, elements, include_self=(i == 0))
+        return elements
 
-            new_elements = []
-
-            if part.startswith('css:'):
-                selector = part[4:]
-                for elem in elements:
-                    if hasattr(elem, 'select'):
-                        new_elements.extend(elem.select(selector))
-                elements = new_elements
-
-            elif part.startswith('XPath:') or part.startswith('//'):
-                xpath = part[6:] if part.startswith('XPath:') else part
-                for elem in elements:
-                    new_elements.extend(self.xpath_query(elem, xpath))
-                elements = new_elements
-
-            elif part.startswith('json:'):
-                json_path = part[5:]
-                try:
-                    data = json.loads(self.html if hasattr(self, 'html') and self.html.startswith('{') else str(elements[0]) if elements else '{}')
-                    result = self.json_path_query(data, json_path)
-                    if isinstance(result, list):
-                        elements = [str(item) for item in result]
-                    elif result is not None:
-                        elements = [str(result)]
-                    else:
-                        elements = []
-                except json.JSONDecodeError:
-                    elements = []
-
-            elif part.startswith('js:'):
-                js_code = part[3:]
-                try:
-                    result = self.execute_js(js_code, elements)
-                    if isinstance(result, list):
-                        elements = [str(item) for item in result]
-                    elif result is not None:
-                        elements = [str(result)]
+    def _run_step(self, metrics, step: RuleStep, elements: List[Any], include_self: bool = False) -> List[Any]:
+        """执行单个步骤，按规则类型记录耗时"""
+        started = time.perf_counter()
+        try:
+            return self._apply_step(step, elements, include_self)
+        finally:
+            seconds = time.perf_counter() - started
+            kind = runstats.rule_type(step.kind)
+            prometheus.RULE_PARSE_LATENCY.observe(seconds, kind)
+            if metrics is not None:
+                metrics.add_parse(kind, seconds)
+
+    def _match_self(self, step: RuleStep, elem) -> bool:
+        if not getattr(elem, 'name', None) or elem.name == '[document]':
+            return False
+        if step.kind == 'tag':
+            return elem.name == step.arg
+        if step.kind == 'class':
+            classes = elem.get('class') or []
+            return step.arg in classes or ' '.join(classes) == step.arg
+        if step.kind == 'id':
+            return elem.get('id') == step.arg
+        if step.kind == 'css':
+            try:
+                return elem.css.match(step.arg)
+            except Exception:
+                return False
+        return False
+
+    def _apply_step(self, step: RuleStep, elements: List[Any], include_self: bool = False) -> List[Any]:
+        new_elements = []
+
+        if step.kind == 'css':
+            for elem in elements:
+                if hasattr(elem, 'select'):
+                    if include_self and self._match_self(step, elem):
+                        new_elements.append(elem)
+                    new_elements.extend(elem.select(step.arg))
+            return new_elements
+
+        if step.kind == 'xpath':
+            for elem in elements:
+                new_elements.extend(self.xpath_query(elem, step.arg))
+            return new_elements
+
+        if step.kind == 'json':
+            try:
+                data = json.loads(self.html if hasattr(self, 'html') and self.html.startswith('{') else str(elements[0]) if elements else '{}')
+                result = self.json_path_query(data, step.arg)
+                if isinstance(result, list):
+                    return [str(item) for item in result]
+                elif result is not None:
+                    return [str(result)]
+                return []
+            except json.JSONDecodeError:
+                return []
+
+        if step.kind == 'js':
+            try:
+                result = self.execute_js(step.arg, elements)
+                if isinstance(result, list):
+                    return [str(item) for item in result]
+                elif result is not None:
+                    return [str(result)]
+                return []
+            except Exception as e:
+                logger.error(f"JS执行错误: {e}")
+                return []
+
+        selector_name = step.arg
+        selector_index = step.index
+
+        if step.kind == 'class' or step.kind == 'tag':
+            for elem in elements:
+                if hasattr(elem, 'find_all'):
+                    if step.kind == 'class':
+                        found = elem.find_all(class_=selector_name)
                     else:
-                        elements = []
-                except Exception as e:
-                    logger.error(f"JS执行错误: {e}")
-                    elements = []
-
-            else:
-                selector_info = part.split('.')
-                selector_type = selector_info[0] if selector_info else 'tag'
-                selector_name = selector_info[1] if len(selector_info) > 1 else ''
-                selector_index = int(selector_info[2]) if len(selector_info) > 2 and selector_info[2] else 0
-                selector_exclude = selector_info[3] if len(selector_info) > 3 else None
-
-                if selector_type == 'class':
-                    for elem in elements:
-                        if hasattr(elem, 'find_all'):
-                            found = elem.find_all(class_=selector_name)
-                            if selector_exclude and selector_exclude.startswith('!'):
-                                exclude_indices = [int(x) for x in selector_exclude[1:].split(':') if x]
-                                found = [f for j, f in enumerate(found) if j not in exclude_indices]
-                            if selector_index != 0 or selector_exclude:
-                                found = [found[selector_index]] if 0 <= selector_index < len(found) else []
-                            new_elements.extend(found)
-
-                elif selector_type == 'id':
-                    for elem in elements:
-                        found = elem.find(id=selector_name)
-                        if found:
-                            new_elements.append(found)
-
-                elif selector_type == 'tag':
-                    for elem in elements:
-                        if hasattr(elem, 'find_all'):
-                            found = elem.find_all(selector_name)
-                            if selector_exclude and selector_exclude.startswith('!'):
-                                exclude_indices = [int(x) for x in selector_exclude[1:].split(':') if x]
-                                found = [f for j, f in enumerate(found) if j not in exclude_indices]
-                            if selector_index != 0 or selector_exclude:
-                                found = [found[selector_index]] if 0 <= selector_index < len(found) else []
-                            new_elements.extend(found)
-
-                elif selector_type == 'text':
-                    for elem in elements:
-                        if hasattr(elem, 'find_all'):
-                            found = elem.find_all(string=lambda t: selector_name and selector_name in str(t))
-                            if selector_index != 0:
-                                found = [found[selector_index]] if 0 <= selector_index < len(found) else []
-                            new_elements.extend([BeautifulSoup(str(f), 'lxml') for f in found])
-
-                elif selector_type == 'children':
-                    for elem in elements:
-                        if hasattr(elem, 'children'):
-                            new_elements.extend([c for c in elem.children if hasattr(c, 'name')])
-
-                elements = new_elements
-
-        return elements
+                        found = elem.find_all(selector_name)
+                    if include_self and self._match_self(step, elem):
+                        found.insert(0, elem)
+                    exclude_indices = step.exclude_indices
+                    if exclude_indices is not None:
+                        found = [f for j, f in enumerate(found) if j not in exclude_indices]
+                    if selector_index != 0 or step.exclude:
+                        found = [found[selector_index]] if 0 <= selector_index < len(found) else []
+                    new_elements.extend(found)
+
+        elif step.kind == 'id':
+            for elem in elements:
+                if include_self and self._match_self(step, elem):
+                    found = elem
+                else:
+                    found = elem.find(id=selector_name)
+                if found:
+                    new_elements.append(found)
+
+        elif step.kind == 'text':
+            for elem in elements:
+                if hasattr(elem, 'find_all'):
+                    found = elem.find_all(string=lambda t: selector_name and selector_name in str(t))
+                    if selector_index != 0:
+                        found = [found[selector_index]] if 0 <= selector_index < len(found) else []
+                    new_elements.extend([BeautifulSoup(str(f), 'lxml') for f in found])
+
+        elif step.kind == 'children':
+            for elem in elements:
+                if include_self:
+                    # 节点单独解析时，文档的子节点就是节点本身
+                    new_elements.append(elem)
+                elif hasattr(elem, 'children'):
+                    new_elements.extend([c for c in elem.children if hasattr(c, 'name')])
+
+        return new_elements
 
     def xpath_query(self, element, xpath):
         try:
@@ -185,16 +262,323 @@ class JsoupParser:
         return values[0] if len(values) == 1 else values
 
 
+_CLASS_MATCH = '@class = $full or contains(concat(" ", normalize-space(@class), " "), $cls)'
+_TAG_NAME = re.compile(r'^[A-Za-z][A-Za-z0-9_-]*$')
+_TEXT_NODES = etree.XPath('descendant-or-self::text()[not(ancestor::script) and not(ancestor::style)]')
+
+
+@lru_cache(maxsize=512)
+def _lxml_selector(kind: str, arg: str, include_self: bool) -> etree.XPath:
+    """将 css/tag/class/id 步骤翻译为预编译的 XPath 表达式"""
+    axis = 'descendant-or-self::' if include_self else 'descendant::'
+    if kind == 'css':
+        from cssselect import HTMLTranslator
+        return etree.XPath(HTMLTranslator().css_to_xpath(arg, prefix=axis))
+    if kind == 'tag':
+        if _TAG_NAME.match(arg):
+            return etree.XPath(f'{axis}{arg.lower()}')
+        return etree.XPath(f'{axis}*[local-name() = $name]')
+    if kind == 'class':
+        return etree.XPath(f'{axis}*[{_CLASS_MATCH}]')
+    if kind == 'id':
+        return etree.XPath(f'({axis}*[@id = $name])[1]')
+    if kind == 'text':
+        return etree.XPath(f'{axis}text()[contains(., $name)]')
+    raise ValueError(f'不支持的选择器类型: {kind}')
+
+
+class LxmlParser(JsoupParser):
+    """
+    基于单棵 lxml.html 文档树的解析器
+
+    css: 规则由 cssselect 翻译为 XPath，XPath: 规则直接在节点上执行，
+    不再经过 BeautifulSoup 建树和序列化往返。对外接口与 JsoupParser 一致。
+    """
+
+    def __init__(self, html: str, base_url: str = ''):
+        self.html = html
+        started = time.perf_counter()
+        self.tree = self._build_tree(html)
+        _record_parse('document', started)
+        self.root = self.tree
+        self.base_url = base_url
+        self.context = None
+
+    @staticmethod
+    def _build_tree(html: str):
+        if not html or not html.strip():
+            return lxml_html.document_fromstring('<html></html>')
+        try:
+            return lxml_html.document_fromstring(html)
+        except ValueError:
+            # 带有 encoding 声明的字符串需要以字节形式解析
+            return lxml_html.document_fromstring(html.encode('utf-8'))
+
+    def for_element(self, elem) -> 'LxmlParser':
+        """返回以 elem 为根节点的解析器，直接复用已解析的文档树"""
+        if not isinstance(elem, etree._Element):
+            return LxmlParser(str(elem), self.base_url)
+        scoped = copy.copy(self)
+        scoped.context = elem
+        return scoped
+
+    def _apply_step(self, step: RuleStep, elements: List[Any], include_self: bool = False) -> List[Any]:
+        if step.kind in ('json', 'js'):
+            if step.kind == 'json':
+                elements = [self._to_html(e) for e in elements]
+            return super()._apply_step(step, elements, include_self)
+
+        new_elements = []
+        nodes = [e for e in elements if isinstance(e, etree._Element)]
+
+        if step.kind == 'xpath':
+            for elem in nodes:
+                new_elements.extend(self.xpath_query(elem, step.arg))
+            return new_elements
+
+        if step.kind == 'children':
+            for elem in nodes:
+                if include_self:
+                    new_elements.append(elem)
+                else:
+                    new_elements.extend([c for c in elem if isinstance(c.tag, str)])
+            return new_elements
+
+        if step.kind not in ('css', 'tag', 'class', 'id', 'text'):
+            return []
+
+        selector = _lxml_selector(step.kind, step.arg, include_self)
+        for elem in nodes:
+            if step.kind == 'css':
+                found = selector(elem)
+            elif step.kind == 'class':
+                found = selector(elem, full=step.arg, cls=f' {step.arg} ')
+            elif step.kind == 'text':
+                if not step.arg:
+                    continue
+                found = [str(t) for t in selector(elem, name=step.arg)]
+            else:
+                found = selector(elem, name=step.arg)
+
+            if step.kind in ('css', 'id'):
+                new_elements.extend(found)
+                continue
+
+            exclude_indices = step.exclude_indices if step.kind != 'text' else None
+            if exclude_indices is not None:
+                found = [f for j, f in enumerate(found) if j not in exclude_indices]
+            if step.index != 0 or (step.exclude and step.kind != 'text'):
+                found = [found[step.index]] if 0 <= step.index < len(found) else []
+            new_elements.extend(found)
+
+        return new_elements
+
+    def xpath_query(self, element, xpath):
+        try:
+            # 在子节点上执行 // 开头的表达式时限定在该节点内，与整段序列化后再查询的结果一致
+            if xpath.startswith('//') and element.getparent() is not None:
+                xpath = 'descendant-or-self::' + xpath[2:]
+            results = element.xpath(xpath)
+            if not isinstance(results, list):
+                return [str(results)]
+            return [r if isinstance(r, etree._Element) else str(r) for r in results]
+        except Exception as e:
+            logger.error(f"XPath查询错误: {e}")
+            return []
+
+    @staticmethod
+    def _to_html(elem) -> str:
+        if isinstance(elem, etree._Element):
+            return lxml_html.tostring(elem, encoding='unicode')
+        return str(elem)
+
+    def get_text(self, elements):
+        texts = []
+        for elem in elements:
+            if isinstance(elem, etree._Element) and elem.tag in ('script', 'style'):
+                text = (elem.text or '').strip()
+            elif isinstance(elem, etree._Element):
+                text = ''.join(t.strip() for t in _TEXT_NODES(elem))
+            else:
+                text = str(elem).strip()
+            texts.append(text)
+        return texts[0] if len(texts) == 1 else texts
+
+    def get_html(self, elements):
+        htmls = []
+        for elem in elements:
+            if isinstance(elem, etree._Element):
+                htmls.append(lxml_html.tostring(elem, encoding='unicode', pretty_print=True))
+            else:
+                htmls.append(str(elem))
+        return htmls[0] if len(htmls) == 1 else htmls
+
+    def get_attribute(self, elements, attr):
+        values = []
+        for elem in elements:
+            if isinstance(elem, etree._Element):
+                value = elem.get(attr)
+                if value:
+                    values.append(value)
+        return values[0] if len(values) == 1 else values
+
+
+def is_same_chapter(chapter_url: str, url: str) -> bool:
+    """
+    判断正文下一页URL是否仍属于同一章节
+
+    多数站点的正文分页形如 123.html -> 123_2.html，最后一页的“下一页”
+    往往指向下一章 124.html，此时应停止翻页。
+    章节由查询参数区分时（read.php?id=123），章节URL中的参数在下一页中必须保持不变，
+    只允许增加分页参数（read.php?id=123&page=2）；参数被修改或去掉时无法判断，停止翻页。
+    """
+    base, other = urlparse(chapter_url), urlparse(url)
+    if base.netloc != other.netloc:
+        return False
+    base_query, other_query = parse_qs(base.query), parse_qs(other.query)
+    if any(other_query.get(name) != values for name, values in base_query.items()):
+        return False
+    if base.path == other.path:
+        # 路径相同时只能靠新增的参数区分分页，查询参数完全相同的视为同一页
+        return len(other_query) > len(base_query)
+    stem = posixpath.splitext(base.path)[0]
+    if not other.path.startswith(stem):
+        return False
+    rest = other.path[len(stem):]
+    return not (stem[-1:].isalnum() and rest[:1].isalnum())
+
+
+PARSER_BACKENDS = {
+    'bs4': JsoupParser,
+    'lxml': LxmlParser,
+}
+
+
+def _config_int(config: Dict[str, Any], name: str, default: int, minimum: int) -> int:
+    """读取书源配置中的整数项，值无效时使用默认值，避免一项配置错误导致该书源无法抓取"""
+    try:
+        return max(minimum, int(config.get(name, default)))
+    except (TypeError, ValueError):
+        logger.warning(f"书源配置 {name} 无效: {config.get(name)!r}，使用默认值 {default}")
+        return default
+
+
+def _config_positive(config: Dict[str, Any], name: str, cast=float):
+    """读取书源配置中的正数项，未配置或值无效时返回 None，由限速器使用默认值"""
+    value = config.get(name)
+    number = positive_number(value, cast)
+    if value is not None and number is None:
+        logger.warning(f"书源配置 {name} 无效: {value!r}，使用默认值")
+    return number
+
+
+def get_parser_class(source_config):
+    """根据书源配置 config_json.parser 选择解析器，默认 bs4"""
+    config = getattr(source_config, 'config_json', None) or {}
+    backend = config.get('parser', 'bs4')
+    if backend not in PARSER_BACKENDS:
+        logger.warning(f"未知的解析器 {backend}，使用默认解析器")
+        backend = 'bs4'
+    return PARSER_BACKENDS[backend]
+
+
 class BookScraper:
     def __init__(self, source_config):
         self.config = source_config
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        # 连接池按书源在进程内共享，抓取器只借用不持有
+        self.client = get_client(source_config)
+
+        self.parser_class = get_parser_class(source_config)
+
+        config = source_config.config_json or {}
+        self.concurrency = _config_int(config, 'concurrency', DEFAULT_CONCURRENCY, 1)
+
+        self.rate_limit = _config_positive(config, 'rate_limit', float)
+        self.burst = _config_positive(config, 'burst', int)
+        self.max_retries = _config_int(config, 'max_retries', DEFAULT_MAX_RETRIES, 0)
+        self._configured_hosts = set()
+        self.max_pages = _config_int(config, 'max_pages', DEFAULT_MAX_PAGES, 1)
+
+        # 搜索页、详情页、目录页使用条件请求缓存；正文由增量同步跳过，不做缓存
+        self.http_cache = HttpCache(source_config) if config.get('http_cache', True) else None
+
+    def _get(self, url: str, headers: Optional[Dict[str, str]] = None):
+        """经过主机限速的 GET 请求，遇到 429/503 时退避重试"""
+        host = rate_limiter.host_of(url)
+        if (self.rate_limit or self.burst) and host not in self._configured_hosts:
+            rate_limiter.configure(url, self.rate_limit, self.burst)
+            self._configured_hosts.add(host)
+
+        metrics = runstats.current_metrics()
+        source = getattr(self.config, 'name', '') or host
+        for attempt in range(self.max_retries + 1):
+            with runstats.timed('throttle'):
+                rate_limiter.acquire(url)
+            prometheus.SCRAPER_REQUESTS.inc(source)
+            started = time.perf_counter()
+            try:
+                response = self.client.get(url, headers=headers)
+            except Exception:
+                seconds = time.perf_counter() - started
+                prometheus.SCRAPER_LATENCY.observe(seconds, source)
+                prometheus.SCRAPER_ERRORS.inc(source)
+                if metrics is not None:
+                    metrics.record_request(seconds)
+                raise
+            seconds = time.perf_counter() - started
+            prometheus.SCRAPER_LATENCY.observe(seconds, source)
+            if response.status_code >= 400:
+                prometheus.SCRAPER_ERRORS.inc(source)
+            if metrics is not None:
+                metrics.record_request(seconds, len(response.content), response.status_code)
+            if response.status_code not in RETRY_STATUS_CODES:
+                rate_limiter.success(url)
+                return response
+
+            delay = rate_limiter.backoff(url, parse_retry_after(response.headers.get('Retry-After')))
+            if attempt < self.max_retries:
+                if metrics is not None:
+                    metrics.record_retry()
+                logger.warning(f"{host} 返回 {response.status_code}，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+
+        return response
+
+    def _rule(self, rule: str) -> CompiledRule:
+        """获取当前书源规则的编译结果"""
+        return rule_cache.get(rule, self.config)
+
+    def _fetch_parsed(self, url: str, purpose: str, parse: Callable[[str, str], Any]) -> Any:
+        """
+        获取页面并解析，启用缓存时使用条件请求
+
+        服务端返回 304，或响应体与上次相同时，直接返回缓存的解析结果。
+        """
+        if self.http_cache is None:
+            response = self._get(url)
+            response.raise_for_status()
+            return parse(response.text, url)
+
+        entry = self.http_cache.load(url)
+        if entry is not None and purpose in entry.results:
+            response = self._get(url, headers=entry.conditional_headers())
+            if response.status_code == 304:
+                prometheus.HTTP_CACHE_LOOKUPS.inc('hit')
+                return entry.results[purpose]
+        else:
+            response = self._get(url)
+        response.raise_for_status()
+
+        digest = body_hash(response.content)
+        if entry is None or entry.body_hash != digest:
+            entry = CacheEntry(url, body_hash=digest)
+        prometheus.HTTP_CACHE_LOOKUPS.inc('hit' if purpose in entry.results else 'miss')
 
-        if source_config.header:
-            self.session.headers.update(source_config.header)
+        entry.etag = response.headers.get('ETag', '')
+        entry.last_modified = response.headers.get('Last-Modified', '')
+        if purpose not in entry.results:
+            entry.results[purpose] = parse(response.text, url)
+        self.http_cache.save(entry)
+        return entry.results[purpose]
 
     def search(self, keyword: str, page: int = 1) -> List[Dict[str, Any]]:
         search_url_template = self.config.search_url
@@ -204,137 +588,270 @@ class BookScraper:
         search_url = search_url_template.replace('{{key}}', keyword).replace('{{page}}', str(page))
 
         try:
-            response = self.session.get(search_url, timeout=30)
-            response.raise_for_status()
-
-            html = response.text
-
-            if self.config.book_list_rule:
-                parser = JsoupParser(html, search_url)
-                book_elements = parser.parse(self.config.book_list_rule)
-
-                books = []
-                for elem in book_elements:
-                    elem_html = str(elem)
-                    elem_parser = JsoupParser(elem_html)
-
-                    book = {
-                        'name': self._extract_field(elem_parser, self.config.name_rule),
-                        'author': self._extract_field(elem_parser, self.config.author_rule),
-                        'kind': self._extract_field(elem_parser, self.config.kind_rule),
-                        'cover_url': self._extract_field(elem_parser, self.config.cover_url_rule),
-                        'intro': self._extract_field(elem_parser, self.config.intro_rule),
-                        'last_chapter': self._extract_field(elem_parser, self.config.last_chapter_rule),
-                        'book_url': self._extract_field(elem_parser, self.config.book_url_rule),
-                    }
-
-                    if book['name'] and book['book_url']:
-                        if not book['book_url'].startswith('http'):
-                            book['book_url'] = urljoin(self.config.url, book['book_url'])
-                        books.append(book)
-
-                return books
-
-            return []
+            return self._fetch_parsed(search_url, 'search', self._parse_search)
 
         except Exception as e:
             logger.error(f"搜索错误: {e}")
             return []
 
-    def get_book_info(self, book_url: str) -> Dict[str, Any]:
-        try:
-            response = self.session.get(book_url, timeout=30)
-            response.raise_for_status()
-
-            parser = JsoupParser(response.text, book_url)
+    def _parse_search(self, html: str, search_url: str) -> List[Dict[str, Any]]:
+        if not self.config.book_list_rule:
+            return []
 
-            info = {
-                'name': '',
-                'author': '',
-                'kind': '',
-                'cover_url': '',
-                'intro': '',
-                'last_chapter': '',
-                'toc_url': '',
+        parser = self.parser_class(html, search_url)
+        book_elements = parser.parse(self._rule(self.config.book_list_rule))
+
+        books = []
+        for elem in book_elements:
+            elem_parser = parser.for_element(elem)
+
+            book = {
+                'name': self._extract_field(elem_parser, self.config.name_rule),
+                'author': self._extract_field(elem_parser, self.config.author_rule),
+                'kind': self._extract_field(elem_parser, self.config.kind_rule),
+                'cover_url': self._extract_field(elem_parser, self.config.cover_url_rule),
+                'intro': self._extract_field(elem_parser, self.config.intro_rule),
+                'last_chapter': self._extract_field(elem_parser, self.config.last_chapter_rule),
+                'book_url': self._extract_field(elem_parser, self.config.book_url_rule),
             }
 
-            info['name'] = self._extract_field(parser, self.config.name_rule)
-            info['author'] = self._extract_field(parser, self.config.author_rule)
-            info['kind'] = self._extract_field(parser, self.config.kind_rule)
-            info['cover_url'] = self._extract_field(parser, self.config.cover_url_rule)
-            info['intro'] = self._extract_field(parser, self.config.intro_rule)
-            info['last_chapter'] = self._extract_field(parser, self.config.last_chapter_rule)
-            info['toc_url'] = self._extract_field(parser, self.config.toc_url_rule)
+            if book['name'] and book['book_url']:
+                if not book['book_url'].startswith('http'):
+                    book['book_url'] = urljoin(self.config.url, book['book_url'])
+                books.append(book)
 
-            if info['toc_url'] and not info['toc_url'].startswith('http'):
-                info['toc_url'] = urljoin(book_url, info['toc_url'])
+        return books
 
-            return info
+    def get_book_info(self, book_url: str) -> Dict[str, Any]:
+        try:
+            return self._fetch_parsed(book_url, 'info', self._parse_book_info)
 
         except Exception as e:
             logger.error(f"获取书籍详情错误: {e}")
             return {}
 
+    def _parse_book_info(self, html: str, book_url: str) -> Dict[str, Any]:
+        parser = self.parser_class(html, book_url)
+
+        info = {
+            'name': '',
+            'author': '',
+            'kind': '',
+            'cover_url': '',
+            'intro': '',
+            'last_chapter': '',
+            'toc_url': '',
+        }
+
+        info['name'] = self._extract_field(parser, self.config.name_rule)
+        info['author'] = self._extract_field(parser, self.config.author_rule)
+        info['kind'] = self._extract_field(parser, self.config.kind_rule)
+        info['cover_url'] = self._extract_field(parser, self.config.cover_url_rule)
+        info['intro'] = self._extract_field(parser, self.config.intro_rule)
+        info['last_chapter'] = self._extract_field(parser, self.config.last_chapter_rule)
+        info['toc_url'] = self._extract_field(parser, self.config.toc_url_rule)
+
+        if info['toc_url'] and not info['toc_url'].startswith('http'):
+            info['toc_url'] = urljoin(book_url, info['toc_url'])
+
+        return info
+
+    def _crawl_pages(self, start_url: str, fetch_page: Callable[[str], Tuple[Any, List[str]]],
+                     accept: Optional[Callable[[str], bool]] = None, parallel: bool = True) -> List[Any]:
+        """
+        从 start_url 开始按“下一页”规则翻页，按页面顺序返回每页的解析结果
+
+        fetch_page(url) 返回 (result, next_urls)。下一页规则给出多个URL时视为页码列表，
+        parallel 为 True 时这些页面并发预取；已访问过的URL会被跳过，防止循环翻页。
+        单页获取失败时记录日志并跳过，已获取的页面照常返回；起始页失败时抛出异常。
+        """
+        def fetch(url):
+            try:
+                return fetch_page(url)
+            except Exception as e:
+                if url == start_url:
+                    raise
+                logger.error(f"获取分页 {url} 失败: {e}")
+                return None
+
+        results = []
+        visited = {start_url}
+        wave = [start_url]
+
+        while wave and len(results) < self.max_pages:
+            wave = wave[:self.max_pages - len(results)]
+            if len(wave) == 1 or not parallel:
+                pages = [fetch(url) for url in wave]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.concurrency, len(wave)), thread_name_prefix='page-fetch') as executor:
+                    # 与下载章节的线程池相同，经 runstats.submit 提交以计入本次运行的统计
+                    futures = [runstats.submit(executor, fetch, url) for url in wave]
+                    pages = [future.result() for future in futures]
+
+            next_wave = []
+            for page in pages:
+                if page is None:
+                    continue
+                result, next_urls = page
+                results.append(result)
+                for url in next_urls:
+                    if url in visited or (accept is not None and not accept(url)):
+                        continue
+                    visited.add(url)
+                    next_wave.append(url)
+            wave = next_wave
+
+        if wave:
+            logger.warning(f"{start_url} 翻页超过 {self.max_pages} 页，已停止")
+        return results
+
+    def _extract_urls(self, parser: JsoupParser, rule: str, page_url: str) -> List[str]:
+        """按规则提取URL列表：元素有 href 属性时取属性，否则取文本"""
+        if not rule or not rule.strip():
+            return []
+
+        urls = []
+        try:
+            for elem in parser.parse(self._rule(rule)):
+                value = elem.get('href') if hasattr(elem, 'get') else None
+                if not value:
+                    value = parser.get_text([elem])
+                value = (value or '').strip()
+                if value and not value.startswith(('javascript:', '#')):
+                    urls.append(urljoin(page_url, value))
+        except Exception as e:
+            logger.error(f"下一页规则提取错误: {e}")
+        return urls
+
     def get_chapters(self, toc_url: str) -> List[Dict[str, Any]]:
         try:
-            response = self.session.get(toc_url, timeout=30)
-            response.raise_for_status()
+            pages = self._crawl_pages(toc_url, self._fetch_toc_page)
+        except Exception as e:
+            logger.error(f"获取章节列表错误: {e}")
+            return []
 
-            parser = JsoupParser(response.text, toc_url)
+        # 多页目录拼接后按URL去重，并重新连续编号
+        chapters = []
+        seen = set()
+        for page in pages:
+            for chapter in page['chapters']:
+                if chapter['chapter_url'] in seen:
+                    continue
+                seen.add(chapter['chapter_url'])
+                chapter['chapter_index'] = len(chapters) + 1
+                chapters.append(chapter)
+        return chapters
+
+    def _fetch_toc_page(self, toc_url: str) -> Tuple[Dict[str, Any], List[str]]:
+        page = self._fetch_parsed(toc_url, 'toc_page', self._parse_toc_page)
+        return page, page['next']
+
+    def _parse_toc_page(self, html: str, toc_url: str) -> Dict[str, Any]:
+        """解析单页目录，返回 {'chapters': [...], 'next': [...]}"""
+        chapters = self._parse_chapters(html, toc_url)
+        next_urls = []
+        if self.config.next_toc_url_rule:
+            parser = self.parser_class(html, toc_url)
+            next_urls = self._extract_urls(parser, self.config.next_toc_url_rule, toc_url)
+        return {'chapters': chapters, 'next': next_urls}
+
+    def _parse_chapters(self, html: str, toc_url: str) -> List[Dict[str, Any]]:
+        if not self.config.chapter_list_rule:
+            return []
 
-            if self.config.chapter_list_rule:
-                chapter_elements = parser.parse(self.config.chapter_list_rule)
+        parser = self.parser_class(html, toc_url)
+        chapter_elements = parser.parse(self._rule(self.config.chapter_list_rule))
 
-                chapters = []
-                for i, elem in enumerate(chapter_elements):
-                    elem_html = str(elem)
-                    elem_parser = JsoupParser(elem_html)
+        chapters = []
+        for i, elem in enumerate(chapter_elements):
+            elem_parser = parser.for_element(elem)
 
-                    chapter = {
-                        'title': self._extract_field(elem_parser, self.config.chapter_name_rule),
-                        'chapter_url': self._extract_field(elem_parser, self.config.chapter_url_rule),
-                        'chapter_index': i + 1,
-                        'is_vip': False,
-                    }
+            chapter = {
+                'title': self._extract_field(elem_parser, self.config.chapter_name_rule),
+                'chapter_url': self._extract_field(elem_parser, self.config.chapter_url_rule),
+                'chapter_index': i + 1,
+                'is_vip': False,
+            }
 
-                    if chapter['title'] and chapter['chapter_url']:
-                        if not chapter['chapter_url'].startswith('http'):
-                            chapter['chapter_url'] = urljoin(toc_url, chapter['chapter_url'])
-                        chapters.append(chapter)
+            if chapter['title'] and chapter['chapter_url']:
+                if not chapter['chapter_url'].startswith('http'):
+                    chapter['chapter_url'] = urljoin(toc_url, chapter['chapter_url'])
+                chapters.append(chapter)
 
-                return chapters
+        return chapters
 
-            return []
+    def get_chapter_content(self, chapter_url: str) -> str:
+        try:
+            pages = self._crawl_pages(
+                chapter_url,
+                self._fetch_content_page,
+                accept=lambda url: is_same_chapter(chapter_url, url),
+                # 章节本身已在 fetch_chapter_contents 的线程池中并发下载，分页串行获取，
+                # 避免对同一主机产生 concurrency² 个并发请求
+                parallel=False,
+            )
+            return '\n'.join(page for page in pages if page)
 
         except Exception as e:
-            logger.error(f"获取章节列表错误: {e}")
-            return []
+            logger.error(f"获取章节内容错误: {e}")
+            return ''
 
-    def get_chapter_content(self, chapter_url: str) -> str:
-        try:
-            response = self.session.get(chapter_url, timeout=30)
-            response.raise_for_status()
+    def _fetch_content_page(self, url: str) -> Tuple[str, List[str]]:
+        """获取单页正文，返回 (content, next_urls)"""
+        response = self._get(url)
+        response.raise_for_status()
 
-            parser = JsoupParser(response.text, chapter_url)
+        parser = self.parser_class(response.text, url)
 
-            if self.config.content_rule:
-                content_elements = parser.parse(self.config.content_rule)
-                if content_elements:
-                    content = parser.get_html(content_elements)
-                    return content
+        content = ''
+        if self.config.content_rule:
+            content_elements = parser.parse(self._rule(self.config.content_rule))
+            if content_elements:
+                content = parser.get_html(content_elements)
+                if isinstance(content, list):
+                    content = '\n'.join(content)
 
-            return ''
+        next_urls = self._extract_urls(parser, self.config.next_content_url_rule, url)
+        return content, next_urls
 
-        except Exception as e:
-            logger.error(f"获取章节内容错误: {e}")
-            return ''
+    def fetch_chapter_contents(self, chapters: List[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """
+        并发下载章节正文，按传入顺序逐个产出 (chapter_data, content)
+
+        同时在途的请求数不超过书源配置的 concurrency，
+        调用方可以边下载边写库，无需等待全部章节下载完成。
+        """
+        if self.concurrency <= 1:
+            for chapter_data in chapters:
+                yield chapter_data, self.get_chapter_content(chapter_data['chapter_url'])
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='chapter-fetch')
+        pending = deque()
+        chapter_iter = iter(chapters)
+        try:
+            for chapter_data in chapter_iter:
+                pending.append((chapter_data, runstats.submit(executor, self.get_chapter_content, chapter_data['chapter_url'])))
+                if len(pending) >= self.concurrency * 2:
+                    break
+
+            while pending:
+                chapter_data, future = pending.popleft()
+                next_chapter = next(chapter_iter, None)
+                if next_chapter is not None:
+                    pending.append((next_chapter, runstats.submit(executor, self.get_chapter_content, next_chapter['chapter_url'])))
+                yield chapter_data, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
 
     def _extract_field(self, parser: JsoupParser, rule: str) -> str:
         if not rule or not rule.strip():
             return ''
 
         try:
-            elements = parser.parse(rule)
+            elements = parser.parse(self._rule(rule))
             if elements:
                 text = parser.get_text(elements)
                 if isinstance(text, list):
@@ -350,17 +867,95 @@ class ScrapingEngine:
     def __init__(self):
         pass
 
+    def _import_chapters(self, scraper: BookScraper, book, chapters: List[Dict[str, Any]]) -> int:
+        """下载章节正文并按章节顺序批量写入数据库，返回新增章节数"""
+        from books.scrapers.writer import ChapterWriter
+
+        chapters = [c for c in chapters if c.get('chapter_url')]
+
+        with ChapterWriter(book) as writer:
+            for chapter_data, content in scraper.fetch_chapter_contents(chapters):
+                writer.add(chapter_data, content)
+
+        logger.info(f"{book.name}: 新增 {writer.created} 章，更新 {writer.updated} 章")
+        return writer.created
+
+    def _sync_book(self, scraper: BookScraper, book_url: str, source) -> Optional[int]:
+        """
+        增量同步一本书，返回新增章节数；无法获取书籍信息时返回 None
+
+        将最新目录与已入库的章节URL对比，只下载新增章节和正文为空的章节，
+        已有正文的章节仅在标题或序号变化时更新目录信息。
+        """
+        from books.models import Book, Chapter
+        from books.scrapers.writer import ChapterWriter
+        from books.storage import downloaded_chapter_urls
+
+        book = Book.objects.filter(book_url=book_url).first()
+        if book is None:
+            book_info = scraper.get_book_info(book_url)
+            if not book_info.get('name'):
+                return None
+            book = Book.objects.create(
+                book_url=book_url,
+                name=book_info.get('name', ''),
+                author=book_info.get('author', ''),
+                kind=book_info.get('kind', ''),
+                cover_url=book_info.get('cover_url', ''),
+                intro=book_info.get('intro', ''),
+                last_chapter=book_info.get('last_chapter', ''),
+                toc_url=book_info.get('toc_url') or book_url,
+                enabled=True,
+                is_local=False,
+                from_source=source.name,
+            )
+
+        chapters = [c for c in scraper.get_chapters(book.toc_url or book_url) if c.get('chapter_url')]
+        if not chapters:
+            return 0
+
+        with runstats.timed('db'):
+            stored = {
+                url: (title, index, is_vip)
+                for url, title, index, is_vip in Chapter.objects.filter(book=book).values_list(
+                    'chapter_url', 'title', 'chapter_index', 'is_vip'
+                )
+            }
+            with_content = downloaded_chapter_urls(book.pk)
+
+        to_fetch = []
+        changed = []
+        for chapter_data in chapters:
+            chapter_url = chapter_data['chapter_url']
+            if chapter_url not in with_content:
+                to_fetch.append(chapter_data)
+            elif stored[chapter_url] != (chapter_data.get('title', ''), chapter_data.get('chapter_index', 0), chapter_data.get('is_vip', False)):
+                changed.append(chapter_data)
+
+        with ChapterWriter(book) as writer:
+            for chapter_data in changed:
+                writer.add(chapter_data, None)
+            for chapter_data, content in scraper.fetch_chapter_contents(to_fetch):
+                writer.add(chapter_data, content)
+
+        last_chapter = chapters[-1].get('title', '')
+        if book.last_chapter != last_chapter:
+            Book.objects.filter(pk=book.pk).update(last_chapter=last_chapter, updated_at=timezone.now())
+
+        logger.info(f"{book.name}: 同步新增 {writer.created} 章，下载 {len(to_fetch)} 章，更新目录 {len(changed)} 章")
+        return writer.created
+
     def run_search_task(self, task):
         from books.models import Book, Chapter, BookSource
 
         task.status = 'running'
-        task.save()
+        task.save(update_fields=TASK_UPDATE_FIELDS)
 
         try:
             if not task.source:
                 task.status = 'failed'
                 task.error_message = '未指定书源'
-                task.save()
+                task.save(update_fields=TASK_UPDATE_FIELDS)
                 return 0
 
             scraper = BookScraper(task.source)
@@ -372,47 +967,48 @@ class ScrapingEngine:
                 if not book_url:
                     continue
 
-                book, created = Book.objects.update_or_create(
-                    book_url=book_url,
-                    defaults={
-                        'name': book_data.get('name', ''),
-                        'author': book_data.get('author', ''),
-                        'kind': book_data.get('kind', ''),
-                        'cover_url': book_data.get('cover_url', ''),
-                        'intro': book_data.get('intro', ''),
-                        'last_chapter': book_data.get('last_chapter', ''),
-                        'enabled': True,
-                        'is_local': False,
-                        'from_source': task.source.name,
-                    }
-                )
+                with runstats.timed('db'):
+                    book, created = Book.objects.update_or_create(
+                        book_url=book_url,
+                        defaults={
+                            'name': book_data.get('name', ''),
+                            'author': book_data.get('author', ''),
+                            'kind': book_data.get('kind', ''),
+                            'cover_url': book_data.get('cover_url', ''),
+                            'intro': book_data.get('intro', ''),
+                            'last_chapter': book_data.get('last_chapter', ''),
+                            'enabled': True,
+                            'is_local': False,
+                            'from_source': task.source.name,
+                        }
+                    )
 
                 if created:
                     imported_count += 1
                     task.result_count = imported_count
-                    task.save()
+                    task.save(update_fields=TASK_UPDATE_FIELDS)
 
             task.status = 'completed'
-            task.save()
+            task.save(update_fields=TASK_UPDATE_FIELDS)
             return imported_count
 
         except Exception as e:
             task.status = 'failed'
             task.error_message = str(e)
-            task.save()
+            task.save(update_fields=TASK_UPDATE_FIELDS)
             return 0
 
     def run_import_task(self, task):
         from books.models import Book, Chapter, BookSource
 
         task.status = 'running'
-        task.save()
+        task.save(update_fields=TASK_UPDATE_FIELDS)
 
         try:
             if not task.source:
                 task.status = 'failed'
                 task.error_message = '未指定书源'
-                task.save()
+                task.save(update_fields=TASK_UPDATE_FIELDS)
                 return 0
 
             scraper = BookScraper(task.source)
@@ -420,69 +1016,50 @@ class ScrapingEngine:
             if not task.keyword:
                 task.status = 'failed'
                 task.error_message = '未指定书籍URL'
-                task.save()
+                task.save(update_fields=TASK_UPDATE_FIELDS)
                 return 0
 
             book_info = scraper.get_book_info(task.keyword)
             if not book_info.get('name'):
                 task.status = 'failed'
                 task.error_message = '无法获取书籍信息'
-                task.save()
+                task.save(update_fields=TASK_UPDATE_FIELDS)
                 return 0
 
             toc_url = book_info.get('toc_url', task.keyword)
-            book, created = Book.objects.update_or_create(
-                book_url=task.keyword,
-                defaults={
-                    'name': book_info.get('name', ''),
-                    'author': book_info.get('author', ''),
-                    'kind': book_info.get('kind', ''),
-                    'cover_url': book_info.get('cover_url', ''),
-                    'intro': book_info.get('intro', ''),
-                    'last_chapter': book_info.get('last_chapter', ''),
-                    'toc_url': toc_url,
-                    'enabled': True,
-                    'is_local': False,
-                    'from_source': task.source.name,
-                }
-            )
-
-            chapters = scraper.get_chapters(toc_url)
-            imported_chapters = 0
-
-            for chapter_data in chapters:
-                chapter_url = chapter_data.get('chapter_url', '')
-                if not chapter_url:
-                    continue
-
-                content = scraper.get_chapter_content(chapter_url)
-
-                chapter, chapter_created = Chapter.objects.update_or_create(
-                    book=book,
-                    chapter_url=chapter_url,
+            with runstats.timed('db'):
+                book, created = Book.objects.update_or_create(
+                    book_url=task.keyword,
                     defaults={
-                        'title': chapter_data.get('title', ''),
-                        'chapter_index': chapter_data.get('chapter_index', 0),
-                        'is_vip': chapter_data.get('is_vip', False),
-                        'content': content,
+                        'name': book_info.get('name', ''),
+                        'author': book_info.get('author', ''),
+                        'kind': book_info.get('kind', ''),
+                        'cover_url': book_info.get('cover_url', ''),
+                        'intro': book_info.get('intro', ''),
+                        'last_chapter': book_info.get('last_chapter', ''),
+                        'toc_url': toc_url,
+                        'enabled': True,
+                        'is_local': False,
+                        'from_source': task.source.name,
                     }
                 )
 
-                if chapter_created:
-                    imported_chapters += 1
+            chapters = scraper.get_chapters(toc_url)
+            imported_chapters = self._import_chapters(scraper, book, chapters)
 
             book.last_chapter = chapters[-1].get('title', '') if chapters else ''
-            book.save()
+            with runstats.timed('db'):
+                book.save()
 
             task.result_count = imported_chapters
             task.status = 'completed'
-            task.save()
+            task.save(update_fields=TASK_UPDATE_FIELDS)
             return imported_chapters
 
         except Exception as e:
             task.status = 'failed'
             task.error_message = str(e)
-            task.save()
+            task.save(update_fields=TASK_UPDATE_FIELDS)
             return 0
 
     def run_search_task_with_source(self, scheduled_task):
@@ -502,20 +1079,21 @@ class ScrapingEngine:
             if not book_url:
                 continue
 
-            book, created = Book.objects.update_or_create(
-                book_url=book_url,
-                defaults={
-                    'name': book_data.get('name', ''),
-                    'author': book_data.get('author', ''),
-                    'kind': book_data.get('kind', ''),
-                    'cover_url': book_data.get('cover_url', ''),
-                    'intro': book_data.get('intro', ''),
-                    'last_chapter': book_data.get('last_chapter', ''),
-                    'enabled': True,
-                    'is_local': False,
-                    'from_source': scheduled_task.source.name,
-                }
-            )
+            with runstats.timed('db'):
+                book, created = Book.objects.update_or_create(
+                    book_url=book_url,
+                    defaults={
+                        'name': book_data.get('name', ''),
+                        'author': book_data.get('author', ''),
+                        'kind': book_data.get('kind', ''),
+                        'cover_url': book_data.get('cover_url', ''),
+                        'intro': book_data.get('intro', ''),
+                        'last_chapter': book_data.get('last_chapter', ''),
+                        'enabled': True,
+                        'is_local': False,
+                        'from_source': scheduled_task.source.name,
+                    }
+                )
 
             if created:
                 imported_count += 1
@@ -537,51 +1115,76 @@ class ScrapingEngine:
             return 0
 
         toc_url = book_info.get('toc_url', scheduled_task.keyword)
-        book, created = Book.objects.update_or_create(
-            book_url=scheduled_task.keyword,
-            defaults={
-                'name': book_info.get('name', ''),
-                'author': book_info.get('author', ''),
-                'kind': book_info.get('kind', ''),
-                'cover_url': book_info.get('cover_url', ''),
-                'intro': book_info.get('intro', ''),
-                'last_chapter': book_info.get('last_chapter', ''),
-                'toc_url': toc_url,
-                'enabled': True,
-                'is_local': False,
-                'from_source': scheduled_task.source.name,
-            }
-        )
-
-        chapters = scraper.get_chapters(toc_url)
-        imported_chapters = 0
-
-        for chapter_data in chapters:
-            chapter_url = chapter_data.get('chapter_url', '')
-            if not chapter_url:
-                continue
-
-            content = scraper.get_chapter_content(chapter_url)
-
-            chapter, chapter_created = Chapter.objects.update_or_create(
-                book=book,
-                chapter_url=chapter_url,
+        with runstats.timed('db'):
+            book, created = Book.objects.update_or_create(
+                book_url=scheduled_task.keyword,
                 defaults={
-                    'title': chapter_data.get('title', ''),
-                    'chapter_index': chapter_data.get('chapter_index', 0),
-                    'is_vip': chapter_data.get('is_vip', False),
-                    'content': content,
+                    'name': book_info.get('name', ''),
+                    'author': book_info.get('author', ''),
+                    'kind': book_info.get('kind', ''),
+                    'cover_url': book_info.get('cover_url', ''),
+                    'intro': book_info.get('intro', ''),
+                    'last_chapter': book_info.get('last_chapter', ''),
+                    'toc_url': toc_url,
+                    'enabled': True,
+                    'is_local': False,
+                    'from_source': scheduled_task.source.name,
                 }
             )
 
-            if chapter_created:
-                imported_chapters += 1
+        chapters = scraper.get_chapters(toc_url)
+        imported_chapters = self._import_chapters(scraper, book, chapters)
 
         book.last_chapter = chapters[-1].get('title', '') if chapters else ''
-        book.save()
+        with runstats.timed('db'):
+            book.save()
 
         return imported_chapters
 
+    def run_sync_task(self, task):
+        task.status = 'running'
+        task.save(update_fields=TASK_UPDATE_FIELDS)
+
+        try:
+            if not task.source:
+                task.status = 'failed'
+                task.error_message = '未指定书源'
+                task.save(update_fields=TASK_UPDATE_FIELDS)
+                return 0
+
+            if not task.keyword:
+                task.status = 'failed'
+                task.error_message = '未指定书籍URL'
+                task.save(update_fields=TASK_UPDATE_FIELDS)
+                return 0
+
+            scraper = BookScraper(task.source)
+            synced_chapters = self._sync_book(scraper, task.keyword, task.source)
+            if synced_chapters is None:
+                task.status = 'failed'
+                task.error_message = '无法获取书籍信息'
+                task.save(update_fields=TASK_UPDATE_FIELDS)
+                return 0
+
+            task.result_count = synced_chapters
+            task.status = 'completed'
+            task.save(update_fields=TASK_UPDATE_FIELDS)
+            return synced_chapters
+
+        except Exception as e:
+            task.status = 'failed'
+            task.error_message = str(e)
+            task.save(update_fields=TASK_UPDATE_FIELDS)
+            return 0
+
+    def run_sync_task_with_source(self, scheduled_task):
+        """带source的增量同步任务（用于定时任务）"""
+        if not scheduled_task.source or not scheduled_task.keyword:
+            return 0
+
+        scraper = BookScraper(scheduled_task.source)
+        return self._sync_book(scraper, scheduled_task.keyword, scheduled_task.source) or 0
+
     def run_task(self, task_id: int):
         from books.models import ScrapingTask
 
@@ -590,12 +1193,21 @@ class ScrapingEngine:
         except ScrapingTask.DoesNotExist:
             return False
 
+        with runstats.collect_metrics() as metrics:
+            try:
+                return self._dispatch_task(task)
+            finally:
+                ScrapingTask.objects.filter(id=task.id).update(metrics=metrics.as_dict())
+
+    def _dispatch_task(self, task):
         if task.task_type == 'search':
             return self.run_search_task(task)
         elif task.task_type == 'import':
             return self.run_import_task(task)
+        elif task.task_type == 'sync':
+            return self.run_sync_task(task)
         else:
             task.status = 'failed'
             task.error_message = f'未知任务类型: {task.task_type}'
-            task.save()
+            task.save(update_fields=TASK_UPDATE_FIELDS)
             return 0
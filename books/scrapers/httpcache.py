@@ -0,0 +1,90 @@
+"""
+条件请求缓存
+
+按书源和URL在磁盘上保存 ETag / Last-Modified、响应体哈希以及解析结果。
+再次抓取时发送 If-None-Match / If-Modified-Since，服务端返回 304
+或响应体哈希未变化时直接复用上次的解析结果，跳过 HTML 解析。
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def body_hash(content: bytes) -> str:
+    return hashlib.sha1(content).hexdigest()
+
+
+class CacheEntry:
+    def __init__(self, url: str, version: str = '', etag: str = '', last_modified: str = '',
+                 body_hash: str = '', results: Optional[Dict[str, Any]] = None):
+        self.url = url
+        self.version = version
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        self.results = results or {}
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'version': self.version,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'body_hash': self.body_hash,
+            'results': self.results,
+        }
+
+
+class HttpCache:
+    """
+    单个书源的磁盘缓存
+
+    书源规则变化（updated_at 改变）后旧的解析结果不再可信，整条缓存作废。
+    """
+
+    def __init__(self, source_config, cache_dir: Optional[Path] = None):
+        cache_dir = cache_dir or Path(getattr(settings, 'HTTP_CACHE_DIR', Path(tempfile.gettempdir()) / 'novel_http_cache'))
+        self.directory = Path(cache_dir) / str(source_config.pk or 'default')
+        self.version = source_config.updated_at.isoformat() if source_config.updated_at else ''
+
+    def _path(self, url: str) -> Path:
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return self.directory / digest[:2] / f'{digest}.json'
+
+    def load(self, url: str) -> Optional[CacheEntry]:
+        try:
+            with open(self._path(url), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('url') != url or data.get('version') != self.version:
+            return None
+        return CacheEntry(**data)
+
+    def save(self, entry: CacheEntry):
+        entry.version = self.version
+        path = self._path(entry.url)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入HTTP缓存失败: {e}")
@@ -0,0 +1,105 @@
+"""
+APScheduler 数据库任务存储
+
+任务序列化后保存在 SchedulerJob 表中，结构与 APScheduler 自带的 SQLAlchemyJobStore 一致：
+next_run_time 为 UTC 时间戳并建有索引，调度器每次唤醒只查询到期的任务。
+调度器重启后任务的下次执行时间不会重新计算，停机期间错过的执行按任务的
+misfire_grace_time / coalesce 设置补执行。
+"""
+import logging
+import pickle
+
+from apscheduler.job import Job
+from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+from django.db import IntegrityError, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class DjangoJobStore(BaseJobStore):
+    def __init__(self, pickle_protocol: int = pickle.HIGHEST_PROTOCOL):
+        super().__init__()
+        self.pickle_protocol = pickle_protocol
+
+    @property
+    def model(self):
+        from books.models import SchedulerJob
+        return SchedulerJob
+
+    def _serialize(self, job) -> bytes:
+        return pickle.dumps(job.__getstate__(), self.pickle_protocol)
+
+    def _reconstitute_job(self, job_state: bytes):
+        state = pickle.loads(job_state)
+        state['jobstore'] = self
+        job = Job.__new__(Job)
+        job.__setstate__(state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def _get_jobs(self, queryset):
+        jobs = []
+        failed_ids = []
+        for job_id, job_state in queryset.order_by('next_run_time').values_list('id', 'job_state'):
+            try:
+                jobs.append(self._reconstitute_job(bytes(job_state)))
+            except Exception as e:
+                logger.error(f"恢复调度器任务 {job_id} 失败，已删除: {e}")
+                failed_ids.append(job_id)
+        if failed_ids:
+            self.model.objects.filter(id__in=failed_ids).delete()
+        return jobs
+
+    def lookup_job(self, job_id):
+        job_state = self.model.objects.filter(id=job_id).values_list('job_state', flat=True).first()
+        return self._reconstitute_job(bytes(job_state)) if job_state else None
+
+    def get_due_jobs(self, now):
+        # 调度器线程长期持有连接，每次唤醒时回收失效的连接
+        close_old_connections()
+        timestamp = datetime_to_utc_timestamp(now)
+        return self._get_jobs(self.model.objects.filter(next_run_time__lte=timestamp))
+
+    def get_next_run_time(self):
+        next_run_time = (
+            self.model.objects.filter(next_run_time__isnull=False)
+            .order_by('next_run_time').values_list('next_run_time', flat=True).first()
+        )
+        return utc_timestamp_to_datetime(next_run_time)
+
+    def get_all_jobs(self):
+        jobs = self._get_jobs(self.model.objects.all())
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def add_job(self, job):
+        try:
+            with transaction.atomic():
+                self.model.objects.create(
+                    id=job.id,
+                    next_run_time=datetime_to_utc_timestamp(job.next_run_time),
+                    job_state=self._serialize(job),
+                )
+        except IntegrityError:
+            raise ConflictingIdError(job.id)
+
+    def update_job(self, job):
+        updated = self.model.objects.filter(id=job.id).update(
+            next_run_time=datetime_to_utc_timestamp(job.next_run_time),
+            job_state=self._serialize(job),
+        )
+        if not updated:
+            raise JobLookupError(job.id)
+
+    def remove_job(self, job_id):
+        deleted, _ = self.model.objects.filter(id=job_id).delete()
+        if not deleted:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self):
+        self.model.objects.all().delete()
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__}>'
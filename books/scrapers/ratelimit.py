@@ -0,0 +1,160 @@
+"""
+按主机限速
+
+进程内所有 BookScraper 共享同一个 HostRateLimiter，每个主机一个令牌桶。
+遇到 429/503 时对该主机暂停并降低速率，请求恢复成功后逐步回升。
+"""
+import math
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+# 未在书源 config_json 中配置时的默认速率（请求/秒）和突发容量
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+
+# 退避参数
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 120.0
+MIN_PENALTY = 0.1
+
+
+def positive_number(value, cast=float):
+    """
+    把配置值转换为正数，无法转换、非有限值或不大于 0 时返回 None
+
+    速率为 0 或负数会把同一主机上所有书源的请求压到极低的速度，因此一律视为未配置。
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not math.isfinite(number) or number <= 0:
+        return None
+    return number
+
+
+class TokenBucket:
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.penalty = 1.0
+        self.failures = 0
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def effective_rate(self) -> float:
+        return max(self.rate * self.penalty, 0.01)
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.effective_rate)
+            self.updated = now
+
+    def reserve(self) -> float:
+        """预占一个令牌，返回调用方需要等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(0.0, self.blocked_until - now)
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.effective_rate)
+            return wait
+
+    def backoff(self, retry_after: Optional[float] = None) -> float:
+        """服务端限流时暂停该主机并降低速率，返回暂停秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self.failures += 1
+            self.penalty = max(MIN_PENALTY, self.penalty / 2)
+            delay = retry_after if retry_after is not None else BACKOFF_BASE * (2 ** (self.failures - 1))
+            delay = min(delay, BACKOFF_MAX)
+            self.blocked_until = max(self.blocked_until, now + delay)
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = max(self.updated, self.blocked_until)
+            return delay
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            if self.penalty < 1.0:
+                self.penalty = min(1.0, self.penalty * 1.25)
+
+
+class HostRateLimiter:
+    """进程级的主机限速器"""
+
+    def __init__(self):
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket()
+            return bucket
+
+    def configure(self, url: str, rate: Optional[float] = None, burst: Optional[int] = None):
+        """按书源配置调整主机的速率和突发容量"""
+        host = self.host_of(url)
+        if not host:
+            return
+        # 无效值直接忽略，不能让一个书源的错误配置影响共享的主机令牌桶
+        rate = positive_number(rate, float)
+        burst = positive_number(burst, int)
+        bucket = self.bucket(host)
+        with bucket.lock:
+            if rate:
+                bucket.rate = rate
+            if burst:
+                bucket.burst = burst
+                bucket.tokens = min(bucket.tokens, bucket.burst)
+
+    def acquire(self, url: str):
+        """阻塞直到允许向 url 所在主机发出请求"""
+        host = self.host_of(url)
+        if not host:
+            return
+        wait = self.bucket(host).reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def backoff(self, url: str, retry_after: Optional[float] = None) -> float:
+        return self.bucket(self.host_of(url)).backoff(retry_after)
+
+    def success(self, url: str):
+        self.bucket(self.host_of(url)).success()
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头，支持秒数和 HTTP 日期两种格式"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+rate_limiter = HostRateLimiter()
@@ -0,0 +1,142 @@
+"""
+书源规则编译
+
+将规则字符串（如 ``class.list@tag.a``、``css:div > a``、``XPath://a``）
+预先拆分为步骤列表，避免每次解析时重复 split 和前缀判断。
+编译结果按规则文本缓存在有界 LRU 中，书源更新后对应规则自动失效。
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+RULE_CACHE_SIZE = 2048
+
+
+class RuleStep:
+    """规则中以 @ 分隔的单个步骤"""
+    __slots__ = ('kind', 'arg', 'index', 'exclude')
+
+    def __init__(self, kind: str, arg: str = '', index: int = 0, exclude: Optional[str] = None):
+        self.kind = kind
+        self.arg = arg
+        self.index = index
+        self.exclude = exclude
+
+    @property
+    def exclude_indices(self) -> Optional[List[int]]:
+        if self.exclude and self.exclude.startswith('!'):
+            return [int(x) for x in self.exclude[1:].split(':') if x]
+        return None
+
+    def __repr__(self):
+        return f'RuleStep({self.kind!r}, {self.arg!r}, {self.index}, {self.exclude!r})'
+
+
+class CompiledRule:
+    """编译后的规则，可被多个解析器重复使用"""
+    __slots__ = ('text', 'steps')
+
+    def __init__(self, text: str, steps: Tuple[RuleStep, ...]):
+        self.text = text
+        self.steps = steps
+
+    def __bool__(self):
+        return bool(self.steps)
+
+    def __repr__(self):
+        return f'CompiledRule({self.text!r})'
+
+
+def _compile_step(part: str) -> RuleStep:
+    if part.startswith('css:'):
+        return RuleStep('css', part[4:])
+    if part.startswith('XPath:'):
+        return RuleStep('xpath', part[6:])
+    if part.startswith('//'):
+        return RuleStep('xpath', part)
+    if part.startswith('json:'):
+        return RuleStep('json', part[5:])
+    if part.startswith('js:'):
+        return RuleStep('js', part[3:])
+
+    selector_info = part.split('.')
+    selector_type = selector_info[0] if selector_info else 'tag'
+    selector_name = selector_info[1] if len(selector_info) > 1 else ''
+    selector_index = int(selector_info[2]) if len(selector_info) > 2 and selector_info[2] else 0
+    selector_exclude = selector_info[3] if len(selector_info) > 3 else None
+    return RuleStep(selector_type, selector_name, selector_index, selector_exclude)
+
+
+def compile_rule(rule: str) -> CompiledRule:
+    """将规则字符串编译为步骤列表"""
+    if not rule or not rule.strip():
+        return CompiledRule(rule or '', ())
+
+    steps = tuple(
+        _compile_step(part)
+        for part in rule.split('@')
+        if part and part.strip() != ''
+    )
+    return CompiledRule(rule, steps)
+
+
+class RuleCache:
+    """按规则文本缓存编译结果的有界 LRU，线程安全"""
+
+    def __init__(self, maxsize: int = RULE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._rules: 'OrderedDict[str, CompiledRule]' = OrderedDict()
+        self._source_versions: Dict[int, object] = {}
+        self._source_rules: Dict[int, set] = {}
+        self._lock = threading.Lock()
+
+    def get(self, rule: str, source=None) -> CompiledRule:
+        if not rule or not rule.strip():
+            return compile_rule(rule)
+
+        with self._lock:
+            if source is not None and source.pk is not None:
+                self._check_source(source)
+                self._source_rules.setdefault(source.pk, set()).add(rule)
+
+            compiled = self._rules.get(rule)
+            if compiled is not None:
+                self._rules.move_to_end(rule)
+                return compiled
+
+        compiled = compile_rule(rule)
+
+        with self._lock:
+            self._rules[rule] = compiled
+            self._rules.move_to_end(rule)
+            while len(self._rules) > self.maxsize:
+                self._rules.popitem(last=False)
+        return compiled
+
+    def _check_source(self, source):
+        """书源的 updated_at 变化时丢弃它登记过的规则，这是唯一的失效途径"""
+        version = source.updated_at
+        if self._source_versions.get(source.pk) == version:
+            return
+        for rule in self._source_rules.pop(source.pk, ()):
+            self._rules.pop(rule, None)
+        self._source_versions[source.pk] = version
+
+    def clear(self):
+        with self._lock:
+            self._rules.clear()
+            self._source_versions.clear()
+            self._source_rules.clear()
+
+    def __len__(self):
+        return len(self._rules)
+
+
+rule_cache = RuleCache()
+
+
+def get_compiled_rule(rule, source=None) -> CompiledRule:
+    """获取编译后的规则，已编译的规则原样返回"""
+    if isinstance(rule, CompiledRule):
+        return rule
+    return rule_cache.get(rule, source)
@@ -0,0 +1,131 @@
+"""
+抓取运行的分阶段统计
+
+一次任务运行期间，HTTP 请求、规则解析和数据库写入各自累计耗时，
+用于判断慢任务是受网络、解析还是数据库限制。
+当前统计对象保存在 contextvars 中，下载章节的线程池通过 copy_context() 继承；
+没有进行中的统计时，各记录函数直接返回，不产生额外开销。
+"""
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+# 规则步骤类型到统计分类的映射，其余（class./tag./id. 等）为阅读默认的 JSoup 规则
+RULE_TYPES = {'css': 'css', 'xpath': 'xpath', 'json': 'json', 'js': 'js'}
+DEFAULT_RULE_TYPE = 'default'
+
+_current: contextvars.ContextVar[Optional['RunMetrics']] = contextvars.ContextVar('run_metrics', default=None)
+
+
+class RunMetrics:
+    """一次运行的统计数据，可被多个下载线程同时写入"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.requests = 0
+        self.retries = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.bytes = 0
+        self.fetch_seconds = 0.0
+        self.throttle_seconds = 0.0
+        self.parse_seconds: Dict[str, float] = defaultdict(float)
+        self.db_seconds = 0.0
+
+    def record_request(self, seconds: float, nbytes: int = 0, status_code: Optional[int] = None):
+        """记录一次 HTTP 请求，status_code 为空表示连接失败、超时等网络错误"""
+        with self._lock:
+            self.requests += 1
+            self.fetch_seconds += seconds
+            self.bytes += nbytes
+            if status_code == 304:
+                self.not_modified += 1
+            elif status_code is None or status_code >= 400:
+                self.errors += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def add(self, phase: str, seconds: float):
+        """累计 throttle / db 阶段耗时"""
+        with self._lock:
+            setattr(self, f'{phase}_seconds', getattr(self, f'{phase}_seconds') + seconds)
+
+    def add_parse(self, rule_type: str, seconds: float):
+        with self._lock:
+            self.parse_seconds[rule_type] += seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            parse = {kind: round(seconds, 4) for kind, seconds in sorted(self.parse_seconds.items())}
+            return {
+                'total_seconds': round(time.perf_counter() - self._started, 4),
+                'fetch': {
+                    'seconds': round(self.fetch_seconds, 4),
+                    'throttle_seconds': round(self.throttle_seconds, 4),
+                    'requests': self.requests,
+                    'retries': self.retries,
+                    'not_modified': self.not_modified,
+                    'errors': self.errors,
+                    'bytes': self.bytes,
+                },
+                'parse': {
+                    'seconds': round(sum(self.parse_seconds.values()), 4),
+                    'by_type': parse,
+                },
+                'db': {
+                    'seconds': round(self.db_seconds, 4),
+                },
+            }
+
+
+def current_metrics() -> Optional[RunMetrics]:
+    return _current.get()
+
+
+@contextmanager
+def collect_metrics():
+    """
+    开始统计并返回统计对象，结束时恢复之前的状态
+
+    已经处于统计中时复用外层的统计对象，嵌套调用（例如 worker 执行定时任务）只统计一份。
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        yield metrics
+        return
+
+    metrics = RunMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(phase: str):
+    """累计代码块耗时到 throttle / db 阶段"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(phase, time.perf_counter() - started)
+
+
+def rule_type(step_kind: str) -> str:
+    return RULE_TYPES.get(step_kind, DEFAULT_RULE_TYPE)
+
+
+def submit(executor, fn, *args):
+    """向线程池提交任务，任务在当前上下文的副本中执行，继承进行中的统计"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
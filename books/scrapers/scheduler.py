@@ -1,177 +1,510 @@
+"""
+定时任务调度器
+
+任务保存在数据库任务存储（SchedulerJob 表）中，重启后保留下次执行时间，
+停机期间错过的执行按 misfire_grace_time / coalesce 补执行。
+多个进程都可以调用 start_scheduler()，通过 SchedulerLock 表选出一个主节点运行调度器，
+其余进程待命，主节点失去响应超过 LEADER_TTL 秒后由其他进程接管。
+主节点启动时对比定时任务与已存储的任务，只增删改有变化的部分；
+运行期间每隔 LEADER_CHECK_INTERVAL 秒续约并同步新修改的定时任务。
+"""
 import os
-from datetime import datetime, timedelta
+import socket
+import threading
+import zlib
+from datetime import timedelta
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'novel_source_site.settings')
 
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_STOPPED
+from apscheduler.triggers.base import BaseTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 
-scheduler = BackgroundScheduler()
-scheduler.start()
+from books.scrapers.jobstore import DjangoJobStore
+from books.scrapers.runstats import collect_metrics
+
+# 章节数、分类书籍数对账间隔（秒）
+RECONCILE_INTERVAL = 6 * 3600
+
+LEADER_LOCK = 'scheduler'
+# 主节点锁有效期和续约间隔（秒）
+LEADER_TTL = 60
+LEADER_CHECK_INTERVAL = 15
+
+scheduler = BackgroundScheduler(
+    jobstores={'default': DjangoJobStore(), 'memory': MemoryJobStore()},
+    job_defaults={'max_instances': 1},
+)
+
+_leader = False
+_leader_thread = None
+_stop_event = threading.Event()
+_owner = ''
+
+
+def enqueue_scheduled_task(task_id):
+    """调度器触发定时任务时只入队，由 worker 进程执行"""
+    import django
+    django.setup()
+
+    from books.scrapers.worker import enqueue_scheduled_task as enqueue
+
+    try:
+        enqueue(task_id)
+    except Exception as e:
+        print(f'定时任务入队失败: {e}')
 
 
-def run_scheduled_task(task_id):
-    """执行定时任务"""
+def run_scheduled_task(task_id, scraping_task=None):
+    """执行定时任务，由 worker 调用；scraping_task 为本次执行对应的队列记录"""
     import django
     django.setup()
     
-    from books.models import ScheduledTask, ScheduledTaskLog
+    from django.db.models import F
+    from django.utils import timezone
+    from books.models import ScheduledTask, ScheduledTaskLog, ScrapingTask
     
     try:
         task = ScheduledTask.objects.get(id=task_id)
     except ScheduledTask.DoesNotExist:
-        return
+        return 0
 
-    task.last_run_time = datetime.now()
-    task.total_runs += 1
-    task.save()
+    ScheduledTask.objects.filter(id=task.id).update(last_run_time=timezone.now(), total_runs=F('total_runs') + 1)
 
     log = ScheduledTaskLog.objects.create(
         scheduled_task=task,
         status='running'
     )
 
-    try:
-        from books.scrapers.engine import ScrapingEngine
-        engine = ScrapingEngine()
+    with collect_metrics() as metrics:
+        try:
+            from books.scrapers.engine import ScrapingEngine
+            engine = ScrapingEngine()
 
-        if task.task_type == 'search':
-            count = engine.run_search_task_with_source(task)
-        elif task.task_type == 'import':
-            count = engine.run_import_task_with_source(task)
-        else:
-            count = 0
+            if task.task_type == 'search':
+                count = engine.run_search_task_with_source(task)
+            elif task.task_type == 'import':
+                count = engine.run_import_task_with_source(task)
+            elif task.task_type == 'sync':
+                count = engine.run_sync_task_with_source(task)
+            else:
+                count = 0
 
-        log.status = 'success'
-        log.result_count = count
-        log.end_time = datetime.now()
-        log.save()
+            log.status = 'success'
+            log.result_count = count
+            log.end_time = timezone.now()
+            log.metrics = metrics.as_dict()
+            log.save()
 
-        task.last_result_count = count
-        task.save()
+            ScheduledTask.objects.filter(id=task.id).update(last_result_count=count)
 
-    except Exception as e:
-        log.status = 'failed'
-        log.error_message = str(e)
-        log.end_time = datetime.now()
-        log.save()
+            if scraping_task is not None:
+                ScrapingTask.objects.filter(id=scraping_task.id).update(
+                    status='completed', result_count=count, metrics=log.metrics
+                )
+            return count
 
+        except Exception as e:
+            log.status = 'failed'
+            log.error_message = str(e)
+            log.end_time = timezone.now()
+            log.metrics = metrics.as_dict()
+            log.save()
 
-def add_task_to_scheduler(task):
-    """将定时任务添加到调度器"""
-    if task.status != 'active':
-        return
+            if scraping_task is not None:
+                ScrapingTask.objects.filter(id=scraping_task.id).update(
+                    status='failed', error_message=str(e), metrics=log.metrics
+                )
+            return 0
 
-    try:
-        existing_job = scheduler.get_job(f'task_{task.id}')
-        if existing_job:
-            scheduler.remove_job(f'task_{task.id}')
-    except:
-        pass
 
+class OffsetTrigger(BaseTrigger):
+    """
+    把内部触发器的每次触发时间固定推后 offset 秒
+
+    与 APScheduler 自带的 jitter 不同，偏移量是确定的：同一个任务每次都在相同的相对时间触发，
+    重启后也不变，而间隔相同的不同任务被分散到不同时刻。
+    """
+
+    def __init__(self, trigger, offset):
+        self.trigger = trigger
+        self.offset = offset
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        delta = timedelta(seconds=self.offset)
+        if previous_fire_time is not None:
+            previous_fire_time -= delta
+        fire_time = self.trigger.get_next_fire_time(previous_fire_time, now - delta)
+        return fire_time + delta if fire_time is not None else None
+
+    def __getstate__(self):
+        return {'version': 1, 'trigger': self.trigger, 'offset': self.offset}
+
+    def __setstate__(self, state):
+        self.trigger = state['trigger']
+        self.offset = state['offset']
+
+    def __str__(self):
+        return f'{self.trigger}+{self.offset}s'
+
+    def __repr__(self):
+        return f'<OffsetTrigger ({self.trigger!r}, offset={self.offset})>'
+
+
+def dispatch_offset(task_id, period=None):
+    """任务的固定触发偏移（秒），由任务ID的哈希决定，不超过 SCHEDULER_JITTER_SECONDS 和执行间隔"""
+    from django.conf import settings
+
+    window = getattr(settings, 'SCHEDULER_JITTER_SECONDS', 0)
+    if period:
+        window = min(window, period)
+    if window <= 0:
+        return 0
+    return zlib.crc32(f'task_{task_id}'.encode()) % window
+
+
+def build_trigger(task):
+    """根据定时任务配置生成触发器，配置无效时返回 None"""
     if task.interval_type == 'interval':
+        if task.interval_seconds <= 0:
+            return None
         trigger = IntervalTrigger(seconds=task.interval_seconds)
+        period = task.interval_seconds
     elif task.interval_type == 'cron':
+        parts = task.cron_expression.split()
+        if len(parts) < 5:
+            return None
         try:
-            parts = task.cron_expression.split()
-            if len(parts) >= 5:
-                trigger = CronTrigger(
-                    minute=parts[0],
-                    hour=parts[1],
-                    day=parts[2],
-                    month=parts[3],
-                    day_of_week=parts[4]
-                )
-            else:
-                return
-        except:
-            return
+            trigger = CronTrigger(
+                minute=parts[0],
+                hour=parts[1],
+                day=parts[2],
+                month=parts[3],
+                day_of_week=parts[4]
+            )
+        except ValueError:
+            return None
+        period = None
     else:
-        return
+        return None
 
-    try:
-        scheduler.add_job(
-            run_scheduled_task,
+    offset = dispatch_offset(task.id, period)
+    return OffsetTrigger(trigger, offset) if offset else trigger
+
+
+def job_id(task_id):
+    return f'task_{task_id}'
+
+
+def _record_next_run_time(task_id, next_run_time):
+    from books.models import ScheduledTask
+    ScheduledTask.objects.filter(id=task_id).update(next_run_time=next_run_time)
+
+
+def sync_task(task, job=None):
+    """
+    使调度器中的任务与定时任务配置一致，返回 'added' / 'updated' / 'removed' / None
+
+    job 为调度器中已有的任务（调用方已查询时传入，避免重复读取）。
+    触发器未变化时保留原有的下次执行时间，只更新宽限时间等选项。
+    """
+    trigger = build_trigger(task) if task.status == 'active' else None
+    if trigger is None:
+        if job is not None:
+            job.remove()
+            _record_next_run_time(task.id, None)
+            return 'removed'
+        return None
+
+    options = {
+        'name': task.name,
+        'misfire_grace_time': task.misfire_grace_time,
+        'coalesce': task.coalesce,
+    }
+
+    if job is None:
+        job = scheduler.add_job(
+            enqueue_scheduled_task,
             trigger=trigger,
             args=[task.id],
-            id=f'task_{task.id}',
-            name=task.name,
+            id=job_id(task.id),
             replace_existing=True,
-            max_instances=1
+            **options
         )
-        
-        if task.interval_type == 'interval':
-            next_time = datetime.now() + timedelta(seconds=task.interval_seconds)
-            task.next_run_time = next_time
-        else:
-            job = scheduler.get_job(f'task_{task.id}')
-            if job and job.next_run_time:
-                task.next_run_time = job.next_run_time
-        
-        task.save()
+        _record_next_run_time(task.id, job.next_run_time)
+        return 'added'
+
+    changed = {key: value for key, value in options.items() if getattr(job, key) != value}
+    if str(job.trigger) != str(trigger):
+        if changed:
+            job.modify(**changed)
+        job = job.reschedule(trigger)
+        _record_next_run_time(task.id, job.next_run_time)
+        return 'updated'
+    if changed:
+        job.modify(**changed)
+        return 'updated'
+    return None
+
+
+def sync_tasks(since=None):
+    """
+    将定时任务同步到调度器，返回 {'added': n, 'updated': n, 'removed': n}
+
+    since 为空时对比全部定时任务与已存储的任务；否则只检查 since 之后修改过的定时任务。
+    两种情况都会移除已删除或已停用的定时任务对应的调度器任务。
+    """
+    import django
+    django.setup()
+
+    from django.db import transaction
+    from books.models import ScheduledTask, SchedulerJob
+
+    stats = {'added': 0, 'updated': 0, 'removed': 0}
+
+    def count(result):
+        if result:
+            stats[result] += 1
+
+    if since is None:
+        jobs = {job.id: job for job in scheduler.get_jobs(jobstore='default') if job.id.startswith('task_')}
+        # 首次加载时任务较多，放在一个事务中写入
+        with transaction.atomic():
+            for task in ScheduledTask.objects.filter(status='active').iterator():
+                count(sync_task(task, jobs.pop(job_id(task.id), None)))
+    else:
+        for task in ScheduledTask.objects.filter(updated_at__gte=since).iterator():
+            count(sync_task(task, scheduler.get_job(job_id(task.id), jobstore='default')))
+        active_ids = {job_id(task_id) for task_id in ScheduledTask.objects.filter(status='active').values_list('id', flat=True)}
+        stored_ids = SchedulerJob.objects.filter(id__startswith='task_').values_list('id', flat=True)
+        jobs = {stored_id: None for stored_id in stored_ids if stored_id not in active_ids}
+
+    for stale_id in jobs:
+        scheduler.remove_job(stale_id, jobstore='default')
+        stats['removed'] += 1
+    return stats
+
+
+def add_task_to_scheduler(task):
+    """
+    将定时任务添加到调度器
+
+    当前进程是调度器主节点时立即生效；否则由主节点在 LEADER_CHECK_INTERVAL 秒内同步。
+    """
+    if not _leader:
+        return
+    try:
+        sync_task(task, scheduler.get_job(job_id(task.id), jobstore='default'))
     except Exception as e:
         print(f'添加任务到调度器失败: {e}')
 
 
 def remove_task_from_scheduler(task_id):
     """从调度器移除任务"""
+    if not _leader:
+        return
     try:
-        scheduler.remove_job(f'task_{task_id}')
-    except:
+        scheduler.remove_job(job_id(task_id), jobstore='default')
+    except Exception:
         pass
 
 
-def load_all_tasks():
-    """加载所有启用的定时任务"""
+def _on_job_event(event):
+    """任务触发后记录下一次执行时间"""
+    if not event.job_id.startswith('task_'):
+        return
+    from apscheduler.util import utc_timestamp_to_datetime
+    from books.models import SchedulerJob
+
+    try:
+        timestamp = SchedulerJob.objects.filter(id=event.job_id).values_list('next_run_time', flat=True).first()
+        _record_next_run_time(int(event.job_id[len('task_'):]), utc_timestamp_to_datetime(timestamp))
+    except Exception as e:
+        print(f'更新下次执行时间失败: {e}')
+
+
+scheduler.add_listener(_on_job_event, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+
+
+def reconcile_counts():
+    """定期修正冗余计数"""
     import django
     django.setup()
-    
-    from books.models import ScheduledTask
-    
-    tasks = ScheduledTask.objects.filter(status='active')
-    for task in tasks:
-        add_task_to_scheduler(task)
-    print(f'已加载 {tasks.count()} 个定时任务')
+
+    from books.counters import rebuild_categories, reconcile_chapter_counts
+
+    try:
+        fixed = reconcile_chapter_counts()
+        if fixed:
+            print(f'已修正 {fixed} 本书籍的章节数')
+        fixed = rebuild_categories()
+        if fixed:
+            print(f'已修正 {fixed} 个分类的书籍数')
+    except Exception as e:
+        print(f'计数对账失败: {e}')
+
+
+def add_maintenance_jobs():
+    """添加系统维护任务"""
+    if scheduler.get_job('maintenance_reconcile_counts', jobstore='default'):
+        return
+    scheduler.add_job(
+        reconcile_counts,
+        trigger=IntervalTrigger(seconds=RECONCILE_INTERVAL),
+        id='maintenance_reconcile_counts',
+        name='计数对账',
+        replace_existing=True,
+        coalesce=True
+    )
+
+
+def _acquire_leadership():
+    """获取或续约主节点锁，成功返回 True"""
+    from django.db import IntegrityError, transaction
+    from django.db.models import Q
+    from django.utils import timezone
+
+    from books.models import SchedulerLock
+
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=LEADER_TTL)
+    if SchedulerLock.objects.filter(
+        Q(owner=_owner) | Q(expires_at__lt=now), name=LEADER_LOCK
+    ).update(owner=_owner, expires_at=expires_at):
+        return True
+    try:
+        with transaction.atomic():
+            SchedulerLock.objects.create(name=LEADER_LOCK, owner=_owner, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        return False
+
+
+def _release_leadership():
+    from books.models import SchedulerLock
+    SchedulerLock.objects.filter(name=LEADER_LOCK, owner=_owner).delete()
+
+
+def _become_leader():
+    global _leader
+
+    if scheduler.state == STATE_STOPPED:
+        scheduler.start(paused=True)
+    stats = sync_tasks()
+    add_maintenance_jobs()
+    _leader = True
+    scheduler.resume()
+    print(f"调度器主节点 {_owner} 已启动，新增 {stats['added']} 个、更新 {stats['updated']} 个、移除 {stats['removed']} 个任务")
+
+
+def _leader_loop():
+    """选主循环：待命时尝试获取锁，作为主节点时续约并同步定时任务"""
+    global _leader
+    from django.db import close_old_connections
+    from django.utils import timezone
+
+    synced_at = None
+    while not _stop_event.is_set():
+        try:
+            if _leader:
+                if _acquire_leadership():
+                    now = timezone.now()
+                    sync_tasks(since=synced_at)
+                    synced_at = now - timedelta(seconds=1)
+                else:
+                    _leader = False
+                    scheduler.pause()
+                    print(f'调度器主节点 {_owner} 已失去主节点锁，转为待命')
+            elif _acquire_leadership():
+                synced_at = timezone.now() - timedelta(seconds=1)
+                _become_leader()
+        except Exception as e:
+            print(f'调度器选主失败: {e}')
+        finally:
+            close_old_connections()
+        _stop_event.wait(LEADER_CHECK_INTERVAL)
+
+
+def start_scheduler():
+    """
+    启动调度器选主线程，可在多个进程中调用
+
+    获得主节点锁的进程运行调度器，其余进程待命。
+    """
+    global _leader_thread, _owner
+    import django
+    django.setup()
+
+    if _leader_thread is not None and _leader_thread.is_alive():
+        return
+    _owner = f'{socket.gethostname()}:{os.getpid()}'
+    _stop_event.clear()
+    _leader_thread = threading.Thread(target=_leader_loop, name='scheduler-leader', daemon=True)
+    _leader_thread.start()
+
+
+def stop_scheduler():
+    """停止调度器并释放主节点锁"""
+    global _leader
+
+    _stop_event.set()
+    if _leader_thread is not None:
+        _leader_thread.join(timeout=LEADER_CHECK_INTERVAL)
+    if scheduler.state != STATE_STOPPED:
+        scheduler.shutdown(wait=False)
+    if _leader:
+        _leader = False
+        try:
+            _release_leadership()
+        except Exception as e:
+            print(f'释放调度器主节点锁失败: {e}')
+
+
+def is_leader():
+    return _leader
 
 
 def pause_task(task_id):
     """暂停定时任务"""
+    import django
+    django.setup()
+    from django.utils import timezone
+    from books.models import ScheduledTask
+
+    # update() 不触发 auto_now，需显式更新 updated_at，领导进程的增量同步才能发现该修改
     try:
-        scheduler.pause_job(f'task_{task_id}')
-        import django
-        django.setup()
-        from books.models import ScheduledTask
-        task = ScheduledTask.objects.get(id=task_id)
-        task.status = 'paused'
-        task.save()
+        ScheduledTask.objects.filter(id=task_id).update(status='paused', next_run_time=None, updated_at=timezone.now())
+        remove_task_from_scheduler(task_id)
     except Exception as e:
         print(f'暂停任务失败: {e}')
 
 
 def resume_task(task_id):
     """恢复定时任务"""
+    import django
+    django.setup()
+    from django.utils import timezone
+    from books.models import ScheduledTask
+
     try:
-        scheduler.resume_job(f'task_{task_id}')
-        import django
-        django.setup()
-        from books.models import ScheduledTask
-        task = ScheduledTask.objects.get(id=task_id)
-        task.status = 'active'
-        task.save()
+        ScheduledTask.objects.filter(id=task_id).update(status='active', updated_at=timezone.now())
+        add_task_to_scheduler(ScheduledTask.objects.get(id=task_id))
     except Exception as e:
         print(f'恢复任务失败: {e}')
 
 
 def run_task_now(task_id):
-    """立即执行定时任务"""
-    import threading
-    thread = threading.Thread(target=run_scheduled_task, args=(task_id,))
-    thread.start()
+    """立即执行定时任务：加入队列，由 worker 进程尽快执行"""
+    from books.scrapers.worker import enqueue_scheduled_task as enqueue
+    return enqueue(task_id)
 
 
 if __name__ == '__main__':
-    load_all_tasks()
+    start_scheduler()
     print('定时任务调度器已启动')
     print('按 Ctrl+C 退出')
     
@@ -180,5 +513,5 @@ if __name__ == '__main__':
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        scheduler.shutdown()
+        stop_scheduler()
         print('调度器已停止')
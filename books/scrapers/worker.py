@@ -0,0 +1,296 @@
+"""
+抓取任务 worker
+
+Web 进程和调度器只负责把 ScrapingTask 置为 queued（入队），
+由独立的 ``python manage.py worker`` 进程认领并执行，长时间的导入不再占用 Web 进程。
+
+认领通过一条带状态条件的 UPDATE 完成（queued -> running），多个进程同时认领同一任务时
+只有一个能更新成功，不依赖 SELECT ... FOR UPDATE，SQLite 下同样可用。
+执行期间每隔 HEARTBEAT_INTERVAL 秒刷新 heartbeat_at；进程崩溃或被杀死后，
+心跳超过 STALE_AFTER 秒的任务会被重新入队，超过 MAX_ATTEMPTS 次则标记为失败。
+"""
+import logging
+import os
+import signal
+import socket
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from django.db import close_old_connections
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 15
+STALE_AFTER = 120
+MAX_ATTEMPTS = 3
+
+
+def worker_name(index: int = 0) -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+def enqueue_task(task_id: int) -> bool:
+    """将抓取任务加入队列，任务已在队列中或正在执行时返回 False"""
+    from books.models import ScrapingTask
+
+    return ScrapingTask.objects.filter(id=task_id).exclude(status__in=['queued', 'running']).update(
+        status='queued',
+        error_message='',
+        queued_at=timezone.now(),
+        worker='',
+        attempts=0,
+    ) > 0
+
+
+def enqueue_scheduled_task(scheduled_task_id: int):
+    """
+    为定时任务创建一次执行并入队，返回新建的 ScrapingTask
+
+    该定时任务已有排队或执行中的记录时不再重复入队，返回 None。
+    """
+    from books.models import ScheduledTask, ScrapingTask
+
+    try:
+        scheduled_task = ScheduledTask.objects.get(id=scheduled_task_id)
+    except ScheduledTask.DoesNotExist:
+        return None
+
+    if ScrapingTask.objects.filter(scheduled_task=scheduled_task, status__in=['queued', 'running']).exists():
+        logger.info(f"定时任务 {scheduled_task.name} 上一次执行尚未完成，跳过本次")
+        return None
+
+    return ScrapingTask.objects.create(
+        source=scheduled_task.source,
+        task_type=scheduled_task.task_type,
+        keyword=scheduled_task.keyword,
+        scheduled_task=scheduled_task,
+        status='queued',
+        queued_at=timezone.now(),
+    )
+
+
+def _running_counts():
+    """返回 (正在执行的定时任务数, {书源ID: 正在执行的任务数})"""
+    from django.db.models import Count
+    from books.models import ScrapingTask
+
+    running = ScrapingTask.objects.filter(status='running')
+    scheduled = running.filter(scheduled_task__isnull=False).count()
+    per_source = dict(
+        running.filter(source__isnull=False).values_list('source_id').annotate(n=Count('id')).values_list('source_id', 'n')
+    )
+    return scheduled, per_source
+
+
+def _claim_condition(task_id: int, source_id: Optional[int], scheduled: bool,
+                     scheduled_limit: int, source_limit: int):
+    """
+    认领条件：任务仍在排队，且认领后不超过并发上限
+
+    上限检查写在同一条 UPDATE 的子查询里，多个 worker 同时认领时不会超出。
+    """
+    from django.db.models import Count, IntegerField, Subquery
+    from django.db.models.lookups import LessThan
+    from books.models import ScrapingTask
+
+    def running_count(**filters):
+        return Subquery(
+            ScrapingTask.objects.filter(status='running', **filters)
+            .order_by().values('status').annotate(n=Count('id')).values('n'),
+            output_field=IntegerField(),
+        )
+
+    queryset = ScrapingTask.objects.filter(id=task_id, status='queued')
+    if scheduled and scheduled_limit > 0:
+        queryset = queryset.filter(LessThan(Coalesce(running_count(scheduled_task__isnull=False), 0), scheduled_limit))
+    if source_id is not None and source_limit > 0:
+        queryset = queryset.filter(LessThan(Coalesce(running_count(source_id=source_id), 0), source_limit))
+    return queryset
+
+
+def claim_task(worker: str, scan_limit: int = 50, max_rounds: int = 5):
+    """
+    认领最早入队且未超过并发上限的任务，没有可执行的任务时返回 None
+
+    同时执行的定时任务不超过 SCHEDULED_RUN_CONCURRENCY 个，同一书源同时执行的任务
+    不超过 SOURCE_CONCURRENCY 个（0 表示不限）；超出上限的任务留在队列中，
+    有任务结束后再被认领。已满的书源和定时任务在查询候选时就被排除，
+    队首堆积的大量同源任务不会挡住其他书源的任务。
+    """
+    from django.conf import settings
+    from books.models import ScrapingTask
+
+    scheduled_limit = getattr(settings, 'SCHEDULED_RUN_CONCURRENCY', 0)
+    source_limit = getattr(settings, 'SOURCE_CONCURRENCY', 0)
+
+    for _ in range(max_rounds):
+        scheduled_running, source_running = _running_counts()
+        queued = ScrapingTask.objects.filter(status='queued')
+        if 0 < scheduled_limit <= scheduled_running:
+            queued = queued.filter(scheduled_task__isnull=True)
+        if source_limit > 0:
+            saturated = [source_id for source_id, n in source_running.items() if n >= source_limit]
+            if saturated:
+                queued = queued.exclude(source_id__in=saturated)
+
+        candidates = list(
+            queued.order_by('queued_at', 'id').values_list('id', 'source_id', 'scheduled_task_id')[:scan_limit]
+        )
+        if not candidates:
+            return None
+
+        for task_id, source_id, scheduled_task_id in candidates:
+            now = timezone.now()
+            claimed = _claim_condition(
+                task_id, source_id, scheduled_task_id is not None, scheduled_limit, source_limit
+            ).update(
+                status='running',
+                worker=worker,
+                started_at=now,
+                heartbeat_at=now,
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return ScrapingTask.objects.select_related('source', 'scheduled_task').get(id=task_id)
+            # 被其他进程抢先认领，或其他进程刚好占满了并发名额，重新统计后再查询候选
+            break
+    return None
+
+
+class Heartbeat:
+    """后台线程定期刷新任务的心跳时间"""
+
+    def __init__(self, task_id: int, interval: float = HEARTBEAT_INTERVAL):
+        self.task_id = task_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        from books.models import ScrapingTask
+
+        try:
+            while not self._stop.wait(self.interval):
+                ScrapingTask.objects.filter(id=self.task_id, status='running').update(heartbeat_at=timezone.now())
+        except Exception as e:
+            logger.error(f"刷新任务心跳失败: {e}")
+        finally:
+            close_old_connections()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def execute_task(task) -> int:
+    """执行一个已认领的任务，返回结果数量"""
+    from books.models import ScrapingTask
+    from books.scrapers.engine import ScrapingEngine
+    from books.scrapers.scheduler import run_scheduled_task
+
+    with Heartbeat(task.id):
+        if task.scheduled_task_id:
+            count = run_scheduled_task(task.scheduled_task_id, task)
+        else:
+            count = ScrapingEngine().run_task(task.id) or 0
+
+    # 引擎只更新了状态和结果，这里补上完成时间并兜底未收尾的状态
+    ScrapingTask.objects.filter(id=task.id).update(completed_at=timezone.now(), heartbeat_at=None)
+    ScrapingTask.objects.filter(id=task.id, status='running').update(status='completed', result_count=count)
+    return count
+
+
+def requeue_stale_tasks(stale_after: int = STALE_AFTER, max_attempts: int = MAX_ATTEMPTS) -> int:
+    """回收心跳超时的任务，返回处理的任务数"""
+    from books.models import ScrapingTask
+
+    deadline = timezone.now() - timedelta(seconds=stale_after)
+    stale = ScrapingTask.objects.filter(status='running', heartbeat_at__lt=deadline)
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status='failed',
+        error_message='执行进程失去响应，重试次数已用尽',
+        heartbeat_at=None,
+        completed_at=timezone.now(),
+    )
+    requeued = stale.update(status='queued', worker='', heartbeat_at=None, queued_at=timezone.now())
+    if failed or requeued:
+        logger.warning(f"回收超时任务：重新入队 {requeued} 个，标记失败 {failed} 个")
+    return failed + requeued
+
+
+def run_worker(index: int = 0, poll_interval: float = 2.0, stop_event: Optional[threading.Event] = None,
+               once: bool = False):
+    """
+    worker 主循环：认领并执行任务，队列为空时等待 poll_interval 秒
+
+    stop_event 被设置后执行完当前任务即退出；once 为 True 时队列清空后退出。
+    """
+    stop_event = stop_event or threading.Event()
+    name = worker_name(index)
+    logger.info(f"worker {name} 已启动")
+
+    while not stop_event.is_set():
+        try:
+            task = claim_task(name)
+        except Exception as e:
+            logger.error(f"认领任务失败: {e}")
+            task = None
+
+        if task is None:
+            close_old_connections()
+            if once:
+                break
+            stop_event.wait(poll_interval)
+            continue
+
+        logger.info(f"worker {name} 开始执行任务 #{task.id} {task.get_task_type_display()}: {task.keyword}")
+        try:
+            count = execute_task(task)
+            logger.info(f"任务 #{task.id} 完成，结果数量 {count}")
+        except Exception as e:
+            logger.error(f"任务 #{task.id} 执行失败: {e}")
+            from books.models import ScrapingTask
+            ScrapingTask.objects.filter(id=task.id).update(
+                status='failed', error_message=str(e), heartbeat_at=None, completed_at=timezone.now()
+            )
+        finally:
+            close_old_connections()
+
+    logger.info(f"worker {name} 已退出")
+
+
+def worker_process(index: int, poll_interval: float, stop_event, once: bool, with_scheduler: bool):
+    """
+    ``manage.py worker`` 子进程入口
+
+    spawn 方式（Windows、macOS 的默认方式）启动的子进程不继承父进程已初始化的 Django，
+    需要先执行 django.setup()。本模块在导入时不加载模型，子进程导入入口函数时不会出错。
+    """
+    import django
+    django.setup()
+
+    # 信号发给整个进程组时子进程忽略，由主进程统一通知退出，避免任务执行到一半被打断
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    # 调度器线程只在第一个子进程中运行，主进程保持单线程以便安全地 fork
+    if with_scheduler:
+        from books.scrapers.scheduler import start_scheduler, stop_scheduler
+        start_scheduler()
+    try:
+        run_worker(index, poll_interval, stop_event, once)
+    finally:
+        if with_scheduler:
+            stop_scheduler()
+        # 子进程退出时不执行 atexit，主动写入最后一次指标快照
+        from books import metrics
+        metrics.registry.flush()
@@ -0,0 +1,136 @@
+"""
+章节批量写入
+
+抓取到的章节先在内存中攒批，再用一条
+``INSERT ... ON CONFLICT(book_id, chapter_url) DO UPDATE`` 写入，
+替代逐行 update_or_create 的 SELECT + INSERT/UPDATE。
+正文通过 books.storage 压缩后写入单独的表。
+bulk_create 不触发 post_save 信号，目录缓存由写入器自行失效，
+结束时（包括中途出错）重新生成目录并重算书籍的章节数。
+"""
+from typing import Any, Dict, List, Optional
+
+from django.db import transaction
+
+from books.counters import refresh_chapter_count
+from books.models import Chapter
+from books.scrapers.runstats import timed
+from books.storage import save_contents
+from books.toc import invalidate_toc, rebuild_toc
+
+DEFAULT_BATCH_SIZE = 500
+
+CHAPTER_UPDATE_FIELDS = ['title', 'chapter_index', 'is_vip', 'updated_at']
+
+
+class ChapterWriter:
+    """
+    按批 upsert 章节并统计新增/更新数量
+
+    每批在独立事务中提交，避免下载期间长时间占用 SQLite 写锁。
+    用法::
+
+        with ChapterWriter(book) as writer:
+            for chapter_data, content in ...:
+                writer.add(chapter_data, content)
+        writer.created, writer.updated
+    """
+
+    def __init__(self, book, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.book = book
+        self.batch_size = batch_size
+        self.created = 0
+        self.updated = 0
+        self._written = False
+        self._pending: Dict[str, Chapter] = {}
+        self._pending_meta: Dict[str, Chapter] = {}
+        self._contents: Dict[str, str] = {}
+
+    def add(self, chapter_data: Dict[str, Any], content: Optional[str] = ''):
+        """
+        添加一个待写入的章节
+
+        content 为 None 时只更新标题、序号等目录信息，保留已有正文。
+        """
+        chapter_url = chapter_data['chapter_url']
+        pending = self._pending_meta if content is None else self._pending
+        # 同一批内重复的章节URL只保留最后一次，ON CONFLICT 不能在一条语句中更新同一行两次
+        pending[chapter_url] = Chapter(
+            book=self.book,
+            chapter_url=chapter_url,
+            title=chapter_data.get('title', ''),
+            chapter_index=chapter_data.get('chapter_index', 0),
+            is_vip=chapter_data.get('is_vip', False),
+        )
+        if content is not None:
+            self._contents[chapter_url] = content
+        if len(pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            chapters, self._pending = list(self._pending.values()), {}
+            contents, self._contents = self._contents, {}
+            self._write(chapters, contents)
+        if self._pending_meta:
+            chapters, self._pending_meta = list(self._pending_meta.values()), {}
+            self._write(chapters)
+
+    def _write(self, chapters: List[Chapter], contents: Optional[Dict[str, str]] = None):
+        with timed('db'), transaction.atomic():
+            existing = set(
+                Chapter.objects.filter(
+                    book=self.book,
+                    chapter_url__in=[c.chapter_url for c in chapters],
+                ).values_list('chapter_url', flat=True)
+            )
+            Chapter.objects.bulk_create(
+                chapters,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['book', 'chapter_url'],
+                update_fields=CHAPTER_UPDATE_FIELDS,
+            )
+            if contents is not None:
+                save_contents(self._chapter_ids(chapters, contents))
+            invalidate_toc(self.book.pk)
+
+        self._written = True
+        self.updated += len(existing)
+        self.created += len(chapters) - len(existing)
+
+    def _chapter_ids(self, chapters: List[Chapter], contents: Dict[str, str]) -> Dict[int, str]:
+        """把 {chapter_url: content} 转换为 {chapter_id: content}"""
+        ids = {c.chapter_url: c.pk for c in chapters if c.pk}
+        missing = [url for url in contents if url not in ids]
+        if missing:
+            # 数据库不支持 bulk_create 回填主键时再查询一次
+            ids.update(
+                Chapter.objects.filter(book=self.book, chapter_url__in=missing).values_list('chapter_url', 'id')
+            )
+        return {ids[url]: content for url, content in contents.items() if url in ids}
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._refresh()
+
+    def _refresh(self):
+        """已有批次写入时重算章节数并重新生成目录"""
+        if self._written:
+            with timed('db'):
+                refresh_chapter_count(self.book.pk)
+                rebuild_toc(self.book.pk)
+            self._written = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # 出错时丢弃未提交的批次，但已提交的批次仍需同步章节数和目录
+            self._refresh()
+        return False
@@ -0,0 +1,199 @@
+"""
+书籍全文检索
+
+使用 SQLite FTS5 虚拟表 books_book_fts 索引书名和作者。
+中日韩文字按二元组（bigram）切分后写入索引，unicode61 分词器只需按空格切分，
+因此任意长度的中文关键词都能命中，且结果按 bm25 相关度排序。
+非 SQLite 数据库或索引表不存在时退回 icontains 查询。
+"""
+import re
+from typing import List, Optional, Tuple
+
+from django.db import connection
+from django.db.models import Q
+
+FTS_TABLE = 'books_book_fts'
+
+# bm25 列权重：书名命中比作者命中更相关
+NAME_WEIGHT = 10.0
+AUTHOR_WEIGHT = 5.0
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_TOKEN_RE = re.compile(f'([{_CJK}]+)|([^\\W_{_CJK}]+)')
+
+_available: Optional[bool] = None
+
+
+def _runs(text: str):
+    for match in _TOKEN_RE.finditer(text or ''):
+        cjk, word = match.groups()
+        if cjk:
+            yield True, cjk
+        else:
+            yield False, word.lower()
+
+
+def tokenize(text: str) -> str:
+    """生成写入索引的分词文本：中文切为二元组并在末尾补单字，其余按词小写"""
+    tokens = []
+    for is_cjk, run in _runs(text):
+        if is_cjk and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run)
+    return ' '.join(tokens)
+
+
+def build_match_query(key: str) -> str:
+    """将搜索关键词转换为 FTS5 MATCH 表达式，空白分隔的各段之间为 AND 关系"""
+    phrases = []
+    for segment in key.split():
+        tokens = []
+        runs = list(_runs(segment))
+        for i, (is_cjk, run) in enumerate(runs):
+            if is_cjk and len(run) > 1:
+                tokens.extend(run[j:j + 2] for j in range(len(run) - 1))
+                # 与 tokenize 一致在中文段末尾补单字，后面紧跟数字/字母时短语才能连续匹配；
+                # 最后一段不补，由前缀匹配命中
+                if i < len(runs) - 1:
+                    tokens.append(run[-1])
+            else:
+                tokens.append(run)
+        if tokens:
+            # 末尾词按前缀匹配，单个汉字也能命中以它开头的二元组
+            phrases.append('"' + ' '.join(tokens) + '"*')
+    return ' AND '.join(phrases)
+
+
+def is_available() -> bool:
+    global _available
+    if _available is None:
+        if connection.vendor != 'sqlite':
+            _available = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                _available = cursor.fetchone() is not None
+    return _available
+
+
+def index_book(book):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {FTS_TABLE}(rowid, name, author) VALUES (%s, %s, %s)',
+            [book.pk, tokenize(book.name), tokenize(book.author)],
+        )
+
+
+def unindex_book(book_id: int):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [book_id])
+
+
+def rebuild_index(batch_size: int = 2000) -> int:
+    """重建整个索引，返回写入的书籍数"""
+    from books.models import Book
+
+    if not is_available():
+        return 0
+
+    count = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        rows = []
+        for book_id, name, author in Book.objects.values_list('id', 'name', 'author').iterator(chunk_size=batch_size):
+            rows.append((book_id, tokenize(name), tokenize(author)))
+            if len(rows) >= batch_size:
+                cursor.executemany(f'INSERT INTO {FTS_TABLE}(rowid, name, author) VALUES (%s, %s, %s)', rows)
+                count += len(rows)
+                rows = []
+        if rows:
+            cursor.executemany(f'INSERT INTO {FTS_TABLE}(rowid, name, author) VALUES (%s, %s, %s)', rows)
+            count += len(rows)
+    return count
+
+
+def search_book_ids(key: str, limit: int, offset: int = 0,
+                    after: Optional[Tuple[float, int]] = None) -> List[Tuple[int, float]]:
+    """
+    按相关度检索启用的书籍，返回 [(book_id, score), ...]
+
+    after 为上一页最后一条的 (score, book_id)，用于游标分页；
+    不传时按 offset 分页。score 越小越相关。
+    """
+    match = build_match_query(key)
+    if not match:
+        return []
+
+    rank = f'bm25({FTS_TABLE}, {NAME_WEIGHT}, {AUTHOR_WEIGHT})'
+    sql = (
+        f'SELECT b.id, {rank} AS score FROM {FTS_TABLE} '
+        f'JOIN books_book b ON b.id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s AND b.enabled = 1'
+    )
+    params: list = [match]
+    if after is not None:
+        sql += f' AND ({rank} > %s OR ({rank} = %s AND b.id > %s))'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY score, b.id LIMIT %s'
+    params.append(limit)
+    if after is None and offset:
+        sql += ' OFFSET %s'
+        params.append(offset)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def search_cursor(values) -> Optional[Tuple[float, int]]:
+    """校验解码后的搜索游标 [score, book_id]，类型不符时返回 None"""
+    if not isinstance(values, list) or len(values) != 2:
+        return None
+    score, book_id = values
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        return None
+    if isinstance(book_id, bool) or not isinstance(book_id, int):
+        return None
+    return float(score), book_id
+
+
+def search_books(key: str, limit: int, offset: int = 0,
+                 after: Optional[Tuple[float, int]] = None,
+                 fields: Optional[List[str]] = None):
+    """
+    检索书籍，返回 (books, last_key)
+
+    last_key 为本页最后一条的排序键，可编码为下一页游标；
+    退回 icontains 查询时排序键为 (0, book_id)。
+    指定 fields 时 books 为只包含这些字段的字典（外加 id），而不是 Book 对象。
+    """
+    from books.models import Book
+
+    def load(queryset):
+        return queryset.values('id', *fields) if fields else queryset
+
+    if is_available():
+        hits = search_book_ids(key, limit, offset, after)
+        rows = load(Book.objects.filter(id__in=[book_id for book_id, _ in hits]))
+        books_by_id = {(row['id'] if fields else row.id): row for row in rows}
+        books = [books_by_id[book_id] for book_id, _ in hits if book_id in books_by_id]
+        last_key = (hits[-1][1], hits[-1][0]) if len(hits) == limit else None
+        return books, last_key
+
+    books = load(Book.objects.filter(
+        Q(name__icontains=key) |
+        Q(author__icontains=key)
+    ).filter(enabled=True).order_by('id'))
+    if after is not None:
+        books = list(books.filter(id__gt=after[1])[:limit])
+    else:
+        books = list(books[offset:offset + limit])
+    last_id = (books[-1]['id'] if fields else books[-1].id) if books else None
+    last_key = (0, last_id) if len(books) == limit else None
+    return books, last_key
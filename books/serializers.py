@@ -9,7 +9,7 @@ class ChapterSerializer(serializers.ModelSerializer):
     
     url = serializers.CharField(source='chapter_url')
     index = serializers.IntegerField(source='chapter_index')
-    vip = serializers.BooleanField()
+    vip = serializers.BooleanField(source='is_vip')
     pay = serializers.SerializerMethodField()
     
     def get_pay(self, obj):
@@ -24,9 +24,7 @@ class ChapterDetailSerializer(serializers.ModelSerializer):
     chapterUrl = serializers.CharField(source='chapter_url')
     bookUrl = serializers.CharField(source='book.book_url')
     currentIndex = serializers.IntegerField(source='chapter_index')
-    
-    def get_total(self, obj):
-        return obj.book.chapters.count()
+    total = serializers.IntegerField(source='book.chapter_count', read_only=True)
 
 
 class ChapterContentSerializer(serializers.ModelSerializer):
@@ -0,0 +1,82 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import search
+from .counters import adjust_category_count, adjust_chapter_count, move_category
+from .models import Book, Chapter
+from .toc import invalidate_toc
+
+
+@receiver(post_save, sender=Book)
+def index_book_on_save(sender, instance, **kwargs):
+    search.index_book(instance)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book_on_delete(sender, instance, **kwargs):
+    search.unindex_book(instance.pk)
+
+
+@receiver(post_save, sender=Chapter)
+@receiver(post_delete, sender=Chapter)
+def invalidate_toc_on_chapter_change(sender, instance, **kwargs):
+    invalidate_toc(instance.book_id)
+
+
+@receiver(post_init, sender=Chapter)
+def remember_chapter_book(sender, instance, **kwargs):
+    # 只读取已加载的字段，与 remember_category 相同
+    instance._original_book_id = instance.__dict__.get('book_id') if instance.pk else None
+
+
+@receiver(post_save, sender=Chapter)
+def count_chapter_on_save(sender, instance, created, **kwargs):
+    if created:
+        adjust_chapter_count(instance.book_id, 1)
+    elif instance._original_book_id is not None and instance._original_book_id != instance.book_id:
+        # 章节移动到其他书籍（例如在后台修改所属书籍）
+        adjust_chapter_count(instance._original_book_id, -1)
+        adjust_chapter_count(instance.book_id, 1)
+        invalidate_toc(instance._original_book_id)
+    instance._original_book_id = instance.book_id
+
+
+@receiver(post_delete, sender=Chapter)
+def count_chapter_on_delete(sender, instance, **kwargs):
+    adjust_chapter_count(instance.book_id, -1)
+
+
+def _category_state(book):
+    # 只读取已加载的字段，避免 only()/defer() 查询的书籍因此多查一次数据库
+    if 'kind' not in book.__dict__ or 'enabled' not in book.__dict__:
+        return None
+    return book.kind, book.enabled
+
+
+@receiver(post_init, sender=Book)
+def remember_category(sender, instance, **kwargs):
+    instance._category_state = _category_state(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Book)
+def count_category_on_save(sender, instance, created, **kwargs):
+    state = _category_state(instance)
+    if state is None:
+        return
+    old = None if created else instance._category_state
+    if created or old is not None:
+        move_category(old, state)
+    instance._category_state = state
+
+
+@receiver(pre_delete, sender=Book)
+def load_category_before_delete(sender, instance, **kwargs):
+    if instance._category_state is None:
+        instance._category_state = Book.objects.filter(pk=instance.pk).values_list('kind', 'enabled').first()
+
+
+@receiver(post_delete, sender=Book)
+def count_category_on_delete(sender, instance, **kwargs):
+    state = instance._category_state
+    if state and state[1]:
+        adjust_category_count(state[0], -1)
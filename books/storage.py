@@ -0,0 +1,251 @@
+"""
+章节正文存储
+
+正文压缩后保存在独立的 ChapterContent 表中，Chapter 表只保留目录信息，
+目录、列表查询不再扫过大段正文，数据库体积也随之缩小。
+安装了 zstandard 时使用 zstd 压缩，否则使用标准库 zlib；
+读取时按每行记录的 codec 解压，两种格式可以混存。
+
+所有读写正文的地方都应通过本模块，不直接操作 ChapterContent。
+
+阅读接口通过 get_cached_content 读取，热点正文保存在进程内按字节数淘汰的 LRU 中。
+缓存条目记录正文的 updated_at 作为版本，读取时先查询数据库中的版本（只取一列，不读正文），
+版本不一致即视为失效，因此 worker 进程重新导入正文后，Web 进程不会继续返回旧正文；
+本进程写入正文时也会在提交后直接清除对应条目。
+"""
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from . import metrics
+from .models import Chapter, ChapterContent
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+WRITE_BATCH_SIZE = 500
+READ_CHUNK_SIZE = 200
+
+# 正文热点缓存的默认容量（字节）
+DEFAULT_CONTENT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ContentCache:
+    """按正文 UTF-8 字节数限制容量的 LRU 缓存，线程安全，条目带版本号"""
+
+    def __init__(self, max_bytes: int = DEFAULT_CONTENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[int, Tuple[str, int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chapter_id: int, version: Any = None) -> Optional[str]:
+        """返回缓存的正文；传入 version 时版本不一致的条目视为未命中并移除"""
+        with self._lock:
+            item = self._data.get(chapter_id)
+            if item is not None and version is not None and item[2] != version:
+                del self._data[chapter_id]
+                self.size -= item[1]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(chapter_id)
+            self.hits += 1
+            return item[0]
+
+    def __contains__(self, chapter_id: int) -> bool:
+        with self._lock:
+            return chapter_id in self._data
+
+    def put(self, chapter_id: int, content: str, version: Any = None):
+        nbytes = len(content.encode('utf-8'))
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(chapter_id, None)
+            if old is not None:
+                self.size -= old[1]
+            self._data[chapter_id] = (content, nbytes, version)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (_, evicted, _) = self._data.popitem(last=False)
+                self.size -= evicted
+
+    def discard(self, chapter_ids: Iterable[int]):
+        with self._lock:
+            for chapter_id in chapter_ids:
+                item = self._data.pop(chapter_id, None)
+                if item is not None:
+                    self.size -= item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+content_cache = ContentCache(getattr(settings, 'CONTENT_CACHE_MAX_BYTES', DEFAULT_CONTENT_CACHE_BYTES))
+
+
+def _content_cache_samples():
+    stats = content_cache.stats()
+    return {('hit',): stats['hits'], ('miss',): stats['misses']}
+
+
+metrics.registry.callback_counter(
+    'content_cache_requests_total', '章节正文缓存查询次数', ('result',), _content_cache_samples)
+
+
+def compress(text: str) -> Tuple[str, bytes]:
+    """压缩正文，返回 (codec, data)"""
+    raw = text.encode('utf-8')
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return 'zlib', zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    data = bytes(data)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('正文使用 zstd 压缩，需要安装 zstandard')
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == 'zlib':
+        raw = zlib.decompress(data)
+    else:
+        raw = data
+    return raw.decode('utf-8')
+
+
+def load_content(chapter_id: int) -> str:
+    """读取单个章节的正文，没有正文时返回空字符串"""
+    row = ChapterContent.objects.filter(chapter_id=chapter_id).values_list('codec', 'data').first()
+    if row is None:
+        return ''
+    return decompress(*row)
+
+
+def load_contents(chapter_ids: Iterable[int]) -> Dict[int, str]:
+    """批量读取正文，返回 {chapter_id: content}，没有正文的章节不在结果中"""
+    rows = ChapterContent.objects.filter(chapter_id__in=list(chapter_ids)).values_list('chapter_id', 'codec', 'data')
+    return {chapter_id: decompress(codec, data) for chapter_id, codec, data in rows}
+
+
+def get_cached_content(chapter_id: int) -> str:
+    """
+    先查热点缓存，未命中或版本已变化时从数据库读取并放入缓存；空正文不缓存
+
+    正文可能由其他进程（worker）更新，命中缓存前先核对数据库中的 updated_at。
+    """
+    rows = ChapterContent.objects.filter(chapter_id=chapter_id)
+    version = rows.values_list('updated_at', flat=True).first()
+    if version is None:
+        content_cache.discard([chapter_id])
+        return ''
+    content = content_cache.get(chapter_id, version)
+    if content is None:
+        row = rows.values_list('codec', 'data', 'updated_at').first()
+        if row is None:
+            return ''
+        codec, data, version = row
+        content = decompress(codec, data)
+        if content:
+            content_cache.put(chapter_id, content, version)
+    return content
+
+
+def warm_cache(chapter_ids: Iterable[int]) -> set:
+    """把正文连同版本读入热点缓存，返回有正文的章节ID集合"""
+    rows = ChapterContent.objects.filter(chapter_id__in=list(chapter_ids)).values_list(
+        'chapter_id', 'codec', 'data', 'updated_at'
+    )
+    loaded = set()
+    for chapter_id, codec, data, version in rows:
+        content = decompress(codec, data)
+        if content:
+            content_cache.put(chapter_id, content, version)
+            loaded.add(chapter_id)
+    return loaded
+
+
+def iter_book_contents(book_id: int, start: Optional[int] = None, end: Optional[int] = None,
+                       chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Tuple[str, str, int, str]]:
+    """
+    按章节序号顺序逐章产出 (title, chapter_url, chapter_index, content)
+
+    章节和正文在同一条查询中 LEFT JOIN 取出并分块迭代，内存占用与书籍大小无关。
+    start、end 为包含两端的章节序号范围。
+    """
+    chapters = Chapter.objects.filter(book_id=book_id)
+    if start is not None:
+        chapters = chapters.filter(chapter_index__gte=start)
+    if end is not None:
+        chapters = chapters.filter(chapter_index__lte=end)
+    rows = chapters.order_by('chapter_index', 'id').values_list(
+        'title', 'chapter_url', 'chapter_index', 'body__codec', 'body__data'
+    )
+    for title, chapter_url, chapter_index, codec, data in rows.iterator(chunk_size=chunk_size):
+        yield title, chapter_url, chapter_index, decompress(codec, data) if data is not None else ''
+
+
+def save_content(chapter_id: int, content: str):
+    save_contents({chapter_id: content})
+
+
+def save_contents(contents: Dict[int, str]):
+    """
+    批量写入正文，{chapter_id: content}
+
+    空正文会删除已有记录，章节随之被视为“未下载”。
+    """
+    rows = []
+    empty = []
+    for chapter_id, content in contents.items():
+        if content:
+            codec, data = compress(content)
+            rows.append(ChapterContent(chapter_id=chapter_id, codec=codec, data=data, size=len(content)))
+        else:
+            empty.append(chapter_id)
+
+    with transaction.atomic():
+        if empty:
+            ChapterContent.objects.filter(chapter_id__in=empty).delete()
+        if rows:
+            ChapterContent.objects.bulk_create(
+                rows,
+                batch_size=WRITE_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['chapter'],
+                update_fields=['codec', 'data', 'size', 'updated_at'],
+            )
+        # 提交后再清除缓存，避免并发读取把旧正文重新放回缓存
+        chapter_ids = list(contents.keys())
+        transaction.on_commit(lambda: content_cache.discard(chapter_ids))
+
+
+def downloaded_chapter_urls(book_id: int) -> set:
+    """已保存正文的章节URL集合"""
+    return set(
+        ChapterContent.objects.filter(chapter__book_id=book_id, size__gt=0).values_list('chapter__chapter_url', flat=True)
+    )
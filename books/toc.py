@@ -0,0 +1,62 @@
+"""
+目录物化
+
+每本书的章节目录预先序列化为 JSON 存入 BookToc，BookTocView 直接输出，
+不再逐行加载 Chapter（包括体积很大的 content 字段）并经过序列化器。
+章节写入后缓存失效，下次请求或写入完成时重新生成。
+"""
+import hashlib
+import json
+from typing import Tuple
+
+from .models import Book, BookToc, Chapter
+from .renderers import orjson
+
+
+def dumps(data) -> str:
+    """与 DRF JSONRenderer 默认输出一致的紧凑 JSON，安装了 orjson 时用它加速"""
+    if orjson is not None:
+        text = orjson.dumps(data).decode('utf-8')
+    else:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return text.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+
+
+def build_chapters_json(book_id: int) -> str:
+    """只查询目录所需字段生成章节列表 JSON，不读取 content"""
+    chapters = Chapter.objects.filter(book_id=book_id).order_by('chapter_index').values_list(
+        'title', 'chapter_url', 'chapter_index', 'is_vip'
+    )
+    return dumps([
+        {'title': title, 'url': url, 'index': index, 'vip': is_vip, 'pay': False}
+        for title, url, index, is_vip in chapters.iterator(chunk_size=2000)
+    ])
+
+
+def rebuild_toc(book_id: int) -> Tuple[str, str]:
+    """重新生成目录缓存，返回 (chapters_json, etag)"""
+    chapters_json = build_chapters_json(book_id)
+    etag = hashlib.sha1(chapters_json.encode('utf-8')).hexdigest()
+    BookToc.objects.update_or_create(book_id=book_id, defaults={'chapters_json': chapters_json, 'etag': etag})
+    return chapters_json, etag
+
+
+def get_toc(book_id: int) -> Tuple[str, str]:
+    """读取目录缓存，未命中时重新生成"""
+    cached = BookToc.objects.filter(book_id=book_id).values_list('chapters_json', 'etag').first()
+    if cached is not None:
+        return cached
+    return rebuild_toc(book_id)
+
+
+def invalidate_toc(book_id: int):
+    BookToc.objects.filter(book_id=book_id).delete()
+
+
+def render_toc(book: Book, chapters_json: str) -> str:
+    return '{"bookUrl":' + dumps(book.book_url) + ',"chapters":' + chapters_json + '}'
+
+
+def toc_etag(book: Book, etag: str) -> str:
+    """书籍URL也包含在响应体中，一并计入 ETag"""
+    return '"' + hashlib.sha1(f'{book.book_url}:{etag}'.encode('utf-8')).hexdigest() + '"'
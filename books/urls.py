@@ -1,16 +1,20 @@
 from django.urls import path
 from .views import (
-    BookSearchView, BookDetailView, BookTocView, ChapterContentView,
-    ExploreView, BookSourceView, BookSourcesView, HealthCheckView,
+    BookSearchView, BookDetailView, BookTocView, ChapterContentView, ChapterBatchView,
+    BookExportView,
+    ExploreView, BookSourceView, BookSourcesView, HealthCheckView, MetricsView,
     ScrapingTaskView, RunScrapingTaskView,
     ScheduledTaskView, RunScheduledTaskView, CategoryListView
 )
 
 urlpatterns = [
     path('health/', HealthCheckView.as_view(), name='health-check'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('search/', BookSearchView.as_view(), name='book-search'),
     path('book/<str:book_id>/', BookDetailView.as_view(), name='book-detail'),
     path('book/<str:book_id>/toc/', BookTocView.as_view(), name='book-toc'),
+    path('book/<str:book_id>/chapters/', ChapterBatchView.as_view(), name='chapter-batch'),
+    path('book/<str:book_id>/export/<str:fmt>/', BookExportView.as_view(), name='book-export'),
     path('chapter/<str:chapter_id>/', ChapterContentView.as_view(), name='chapter-content'),
     path('explore/', ExploreView.as_view(), name='explore'),
     path('source/', BookSourceView.as_view(), name='book-source'),
@@ -10,13 +10,32 @@ from django.conf import settings
 from django.db import models
 from django.utils import timezone
 from django.db.models import Q
-from .models import Book, Chapter, BookSource, ScrapingTask, ScheduledTask
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from . import metrics
+from .export import EXPORT_FORMATS, export_filename, get_cached_export, iter_export
+from .fast_serializers import BOOK_DETAIL_COLUMNS, BOOK_LIST_COLUMNS, book_detail_data, book_list_data
+from .models import Book, Category, Chapter, BookSource, ScrapingTask, ScheduledTask, SchedulerJob
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, get_page, get_page_size, keyset_paginate
+from .search import search_books, search_cursor
+from .readahead import read_ahead
+from .renderers import FAST_RENDERERS
+from .storage import content_cache, get_cached_content, iter_book_contents
+from .toc import dumps, get_toc, render_toc, toc_etag
 from .serializers import (
     BookListSerializer, BookDetailSerializer, BookTocSerializer,
-    ChapterContentSerializer, ChapterSerializer
+    ChapterSerializer
 )
 
 
+def invalid_cursor_response():
+    return Response({
+        'code': -1,
+        'msg': '分页游标无效',
+        'data': []
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
 def home(request):
     """首页"""
     return render(request, 'books/index.html')
@@ -26,14 +45,44 @@ class HealthCheckView(APIView):
     def get(self, request):
         return Response({
             'status': 'ok',
-            'message': '服务正常运行'
+            'message': '服务正常运行',
+            'content_cache': content_cache.stats()
         })
 
 
+class MetricsView(APIView):
+    """Prometheus 文本格式的运行指标，合并所有进程的计数，并附带按需查询的任务队列长度"""
+
+    def get(self, request):
+        counts = dict(
+            ScrapingTask.objects.filter(status__in=['pending', 'queued', 'running']).order_by()
+            .values_list('status').annotate(n=models.Count('id'))
+        )
+        oldest = ScrapingTask.objects.filter(status='queued').aggregate(oldest=models.Min('queued_at'))['oldest']
+        now = timezone.now()
+        extra = metrics.gauge_lines(
+            'scraping_tasks', '各状态的抓取任务数',
+            {(('status', task_status),): counts.get(task_status, 0) for task_status in ('pending', 'queued', 'running')},
+        )
+        extra += metrics.gauge_lines(
+            'scraping_queue_oldest_seconds', '最早入队且仍在排队的任务已等待的秒数',
+            {(): (now - oldest).total_seconds() if oldest else 0},
+        )
+        extra += metrics.gauge_lines(
+            'scheduler_jobs_due', '已到执行时间、等待调度器触发的定时任务数',
+            {(): SchedulerJob.objects.filter(next_run_time__lte=now.timestamp()).count()},
+        )
+        body = metrics.render(metrics.registry.collect(), extra)
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class BookSearchView(APIView):
+    renderer_classes = FAST_RENDERERS
+
     def get(self, request):
         key = request.GET.get('key', '').strip()
-        page = int(request.GET.get('page', 1))
+        page = get_page(request)
+        page_size = get_page_size(request)
         
         if not key:
             return Response({
@@ -42,34 +91,42 @@ class BookSearchView(APIView):
                 'data': []
             })
         
-        books = Book.objects.filter(
-            Q(name__icontains=key) | 
-            Q(author__icontains=key)
-        ).filter(enabled=True)
-        
-        start = (page - 1) * 20
-        end = start + 20
-        books = books[start:end]
-        
-        serializer = BookListSerializer(books, many=True)
+        # 优先使用游标分页，未传 cursor 时兼容阅读APP的 page 参数
+        try:
+            values = decode_cursor(request.GET.get('cursor', ''))
+        except InvalidCursor:
+            return invalid_cursor_response()
+        after = search_cursor(values) if values is not None else None
+        if values is not None and after is None:
+            return invalid_cursor_response()
+        books, last_key = search_books(
+            key,
+            limit=page_size,
+            offset=(page - 1) * page_size,
+            after=after,
+            fields=BOOK_LIST_COLUMNS
+        )
         
         return Response({
             'code': 0,
             'msg': 'success',
-            'data': serializer.data
+            'data': book_list_data(books),
+            'next': encode_cursor(list(last_key)) if last_key else None
         })
 
 
 class BookDetailView(APIView):
+    renderer_classes = FAST_RENDERERS
+
     def get(self, request, book_id):
         try:
+            books = Book.objects.filter(enabled=True).values(*BOOK_DETAIL_COLUMNS)
             if book_id.isdigit():
-                book = Book.objects.get(id=book_id, enabled=True)
+                book = books.get(id=book_id)
             else:
-                book = Book.objects.get(book_url=book_id, enabled=True)
+                book = books.get(book_url=book_id)
             
-            serializer = BookDetailSerializer(book)
-            return Response(serializer.data)
+            return Response(book_detail_data(book))
         except Book.DoesNotExist:
             return Response({
                 'error': '书籍不存在'
@@ -80,24 +137,28 @@ class BookTocView(APIView):
     def get(self, request, book_id):
         try:
             if book_id.isdigit():
-                book = Book.objects.get(id=book_id, enabled=True)
+                book = Book.objects.only('id', 'book_url').get(id=book_id, enabled=True)
             else:
-                book = Book.objects.get(book_url=book_id, enabled=True)
-            
-            chapters = book.chapters.all()
-            serializer = ChapterSerializer(chapters, many=True)
-            
-            return Response({
-                'bookUrl': book.book_url,
-                'chapters': serializer.data
-            })
+                book = Book.objects.only('id', 'book_url').get(book_url=book_id, enabled=True)
         except Book.DoesNotExist:
             return Response({
                 'error': '书籍不存在'
             }, status=status.HTTP_404_NOT_FOUND)
 
+        # 直接输出预先序列化的目录，不逐行加载章节
+        chapters_json, etag = get_toc(book.pk)
+        etag = toc_etag(book, etag)
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(render_toc(book, chapters_json), content_type='application/json')
+        response['ETag'] = etag
+        return response
+
 
 class ChapterContentView(APIView):
+    renderer_classes = FAST_RENDERERS
+
     def get(self, request, chapter_id):
         try:
             if chapter_id.isdigit():
@@ -110,14 +171,16 @@ class ChapterContentView(APIView):
                     'error': '书籍已禁用'
                 }, status=status.HTTP_403_FORBIDDEN)
             
-            serializer = ChapterContentSerializer(chapter)
+            content = get_cached_content(chapter.pk)
+            read_ahead.schedule(chapter, include_current=not content)
+
             return Response({
                 'title': chapter.title,
-                'content': chapter.content or '暂无内容',
+                'content': content or '暂无内容',
                 'chapterUrl': chapter.chapter_url,
                 'bookUrl': chapter.book.book_url,
                 'currentIndex': chapter.chapter_index,
-                'total': chapter.book.chapters.count()
+                'total': chapter.book.chapter_count
             })
         except Chapter.DoesNotExist:
             return Response({
@@ -125,26 +188,97 @@ class ChapterContentView(APIView):
             }, status=status.HTTP_404_NOT_FOUND)
 
 
+class ChapterBatchView(APIView):
+    """按章节序号范围批量返回正文，每行一个章节的 NDJSON 流"""
+
+    def get(self, request, book_id):
+        try:
+            if book_id.isdigit():
+                book = Book.objects.get(id=book_id, enabled=True)
+            else:
+                book = Book.objects.get(book_url=book_id, enabled=True)
+        except Book.DoesNotExist:
+            return Response({
+                'error': '书籍不存在'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            start = int(request.GET['start']) if request.GET.get('start') else None
+            end = int(request.GET['end']) if request.GET.get('end') else None
+        except ValueError:
+            return Response({
+                'error': 'start 和 end 必须是整数'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        def lines():
+            for title, chapter_url, chapter_index, content in iter_book_contents(book.pk, start, end):
+                yield dumps({
+                    'title': title,
+                    'content': content or '暂无内容',
+                    'chapterUrl': chapter_url,
+                    'bookUrl': book.book_url,
+                    'currentIndex': chapter_index,
+                    'total': book.chapter_count
+                }) + '\n'
+
+        return StreamingHttpResponse(lines(), content_type='application/x-ndjson; charset=utf-8')
+
+
+class BookExportView(APIView):
+    """导出书籍为 TXT 或 EPUB 文件"""
+
+    def get(self, request, book_id, fmt):
+        try:
+            if book_id.isdigit():
+                book = Book.objects.get(id=book_id, enabled=True)
+            else:
+                book = Book.objects.get(book_url=book_id, enabled=True)
+        except Book.DoesNotExist:
+            return Response({
+                'error': '书籍不存在'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        fmt = fmt.lower()
+        if fmt not in EXPORT_FORMATS:
+            return Response({
+                'error': f'不支持的导出格式: {fmt}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        filename = export_filename(book, fmt)
+        cached, cache_path = get_cached_export(book, fmt)
+        if cached is not None:
+            return FileResponse(open(cached, 'rb'), as_attachment=True, filename=filename,
+                                content_type=EXPORT_FORMATS[fmt])
+
+        response = StreamingHttpResponse(iter_export(book, fmt, cache_path), content_type=EXPORT_FORMATS[fmt])
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        return response
+
+
 class ExploreView(APIView):
+    renderer_classes = FAST_RENDERERS
+
     def get(self, request):
         kind = request.GET.get('type', '').strip()
-        page = int(request.GET.get('page', 1))
         
         books = Book.objects.filter(enabled=True)
         
         if kind:
-            books = books.filter(kind__icontains=kind)
+            books = books.filter(kind=kind)
         
-        start = (page - 1) * 20
-        end = start + 20
-        books = books[start:end]
-        
-        serializer = BookListSerializer(books, many=True)
+        # 最近更新的书籍在前，cursor 为 (updated_at, id)
+        try:
+            books, next_cursor = keyset_paginate(
+                books.values('id', 'updated_at', *BOOK_LIST_COLUMNS), ('-updated_at', '-id'), request
+            )
+        except InvalidCursor:
+            return invalid_cursor_response()
         
         return Response({
             'code': 0,
             'msg': 'success',
-            'data': serializer.data
+            'data': book_list_data(books),
+            'next': next_cursor
         })
 
 
@@ -245,7 +379,12 @@ class BookSourcesView(APIView):
 
 class ScrapingTaskView(APIView):
     def get(self, request):
-        tasks = ScrapingTask.objects.all().order_by('-created_at')[:20]
+        try:
+            tasks, next_cursor = keyset_paginate(
+                ScrapingTask.objects.select_related('source'), ('-created_at', '-id'), request
+            )
+        except InvalidCursor:
+            return invalid_cursor_response()
         
         data = []
         for task in tasks:
@@ -259,12 +398,18 @@ class ScrapingTaskView(APIView):
                 'error_message': task.error_message,
                 'created_at': task.created_at.strftime('%Y-%m-%d %H:%M:%S'),
                 'completed_at': task.completed_at.strftime('%Y-%m-%d %H:%M:%S') if task.completed_at else None,
+                'scheduled_task_id': task.scheduled_task_id,
+                'worker': task.worker,
+                'started_at': task.started_at.strftime('%Y-%m-%d %H:%M:%S') if task.started_at else None,
+                'heartbeat_at': task.heartbeat_at.strftime('%Y-%m-%d %H:%M:%S') if task.heartbeat_at else None,
+                'metrics': task.metrics,
             })
         
         return Response({
             'code': 0,
             'msg': 'success',
-            'data': data
+            'data': data,
+            'next': next_cursor
         })
     
     def post(self, request):
@@ -308,33 +453,32 @@ class RunScrapingTaskView(APIView):
                 'msg': '任务不存在'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        if task.status == 'running':
+        from books.scrapers.worker import enqueue_task
+        
+        if not enqueue_task(task.id):
             return Response({
                 'code': -1,
-                'msg': '任务正在运行中'
+                'msg': '任务正在排队或运行中'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        from books.scrapers.engine import ScrapingEngine
-        
-        engine = ScrapingEngine()
-        
-        import threading
-        thread = threading.Thread(target=engine.run_task, args=(task_id,))
-        thread.start()
-        
         return Response({
             'code': 0,
-            'msg': '任务已开始执行',
+            'msg': '任务已加入队列',
             'data': {
                 'task_id': task.id,
-                'status': task.status
+                'status': 'queued'
             }
         })
 
 
 class ScheduledTaskView(APIView):
     def get(self, request):
-        tasks = ScheduledTask.objects.all().order_by('-created_at')[:20]
+        try:
+            tasks, next_cursor = keyset_paginate(
+                ScheduledTask.objects.select_related('source'), ('-created_at', '-id'), request
+            )
+        except InvalidCursor:
+            return invalid_cursor_response()
         
         data = []
         for task in tasks:
@@ -348,6 +492,8 @@ class ScheduledTaskView(APIView):
                 'interval_type': task.interval_type,
                 'interval_seconds': task.interval_seconds,
                 'cron_expression': task.cron_expression,
+                'misfire_grace_time': task.misfire_grace_time,
+                'coalesce': task.coalesce,
                 'status': task.status,
                 'last_run_time': task.last_run_time.strftime('%Y-%m-%d %H:%M:%S') if task.last_run_time else None,
                 'next_run_time': task.next_run_time.strftime('%Y-%m-%d %H:%M:%S') if task.next_run_time else None,
@@ -359,7 +505,8 @@ class ScheduledTaskView(APIView):
         return Response({
             'code': 0,
             'msg': 'success',
-            'data': data
+            'data': data,
+            'next': next_cursor
         })
     
     def post(self, request):
@@ -372,6 +519,9 @@ class ScheduledTaskView(APIView):
         interval_type = request.data.get('interval_type', 'interval')
         interval_seconds = int(request.data.get('interval_seconds', 3600))
         cron_expression = request.data.get('cron_expression', '')
+        misfire_grace_time = request.data.get('misfire_grace_time', 600)
+        misfire_grace_time = int(misfire_grace_time) if misfire_grace_time is not None else None
+        coalesce = request.data.get('coalesce', True)
         
         source = None
         if source_url:
@@ -392,6 +542,8 @@ class ScheduledTaskView(APIView):
             interval_type=interval_type,
             interval_seconds=interval_seconds,
             cron_expression=cron_expression,
+            misfire_grace_time=misfire_grace_time,
+            coalesce=coalesce in (True, 'true', '1', 1),
             status='active'
         )
         
@@ -417,13 +569,19 @@ class RunScheduledTaskView(APIView):
             }, status=status.HTTP_404_NOT_FOUND)
         
         from books.scrapers.scheduler import run_task_now
-        run_task_now(task_id)
+        run = run_task_now(task_id)
+        if run is None:
+            return Response({
+                'code': -1,
+                'msg': '上一次执行尚未完成'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'code': 0,
-            'msg': '任务已开始执行',
+            'msg': '任务已加入队列',
             'data': {
-                'task_id': task.id
+                'task_id': task.id,
+                'run_id': run.id
             }
         })
     
@@ -447,23 +605,12 @@ class RunScheduledTaskView(APIView):
 
 
 class CategoryListView(APIView):
+    renderer_classes = FAST_RENDERERS
+
     def get(self, request):
-        categories = Book.objects.filter(
-            enabled=True,
-            kind__isnull=False
-        ).exclude(
-            kind=''
-        ).values('kind').annotate(
-            count=models.Count('id')
-        ).order_by('kind')
+        categories = Category.objects.filter(book_count__gt=0).values_list('name', 'book_count')
         
-        data = []
-        for cat in categories:
-            if cat['kind'] not in [d.get('name') for d in data]:
-                data.append({
-                    'name': cat['kind'],
-                    'count': cat['count']
-                })
+        data = [{'name': name, 'count': count} for name, count in categories]
         
         return Response({
             'code': 0,
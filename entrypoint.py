@@ -130,6 +130,18 @@ def seed_data_if_needed():
         print(f"数据初始化检查失败（可选）: {e}")
 
 
+def start_worker():
+    """在后台启动抓取任务 worker，WORKER_PROCESSES=0 时不启动（例如由单独的容器运行 worker）"""
+    processes = os.environ.get('WORKER_PROCESSES', '2')
+    if processes == '0':
+        return None
+    print(f"启动抓取任务 worker（{processes} 个进程）...")
+    return subprocess.Popen(
+        [sys.executable, "manage.py", "worker", "--processes", processes],
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+
+
 def main():
     """主函数"""
     print("=" * 50)
@@ -149,6 +161,7 @@ def main():
         collect_static_files()
         create_admin_user()
         seed_data_if_needed()
+        start_worker()
 
     # 执行原始命令
     os.execv(sys.executable, [sys.executable] + [os.path.join(os.path.dirname(__file__), cmd[0])] + cmd[1:])
@@ -28,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'books.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,3 +92,25 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
 }
+
+# 抓取页面的条件请求缓存目录（ETag/Last-Modified 与解析结果）
+HTTP_CACHE_DIR = BASE_DIR / 'cache' / 'http'
+
+# 章节正文热点缓存容量（字节）与阅读时预读的后续章节数
+CONTENT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+READ_AHEAD_CHAPTERS = 3
+
+# 定时任务分散执行：每个任务的触发时间按任务ID固定推后 0 到该秒数（不超过执行间隔）
+SCHEDULER_JITTER_SECONDS = 600
+# 同时执行的定时任务总数上限，以及同一书源同时执行的抓取任务上限，超出的任务留在队列中等待
+SCHEDULED_RUN_CONCURRENCY = 4
+SOURCE_CONCURRENCY = 2
+
+# 书籍导出缓存：开启后完整导出的 TXT/EPUB 会保存下来，书籍内容变化后自动失效
+EXPORT_CACHE_ENABLED = False
+EXPORT_CACHE_DIR = BASE_DIR / 'cache' / 'export'
+
+# /api/metrics 运行指标：各进程定期把计数快照写入该目录，输出时合并；设为 None 则只输出当前进程的计数
+METRICS_DIR = BASE_DIR / 'cache' / 'metrics'
+METRICS_FLUSH_INTERVAL = 10
+METRICS_SNAPSHOT_TTL = 300
@@ -1,10 +1,10 @@
 #!/usr/bin/env python
 """
-启动脚本 - 同时启动Django服务和定时任务调度器
+启动脚本 - 同时启动Django服务、定时任务调度器和抓取任务 worker
 """
 import os
+import subprocess
 import sys
-import threading
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'novel_source_site.settings')
@@ -13,26 +13,7 @@ import django
 django.setup()
 
 from django.core.management import call_command
-from books.scrapers.scheduler import load_all_tasks, scheduler
-
-
-def run_scheduler():
-    """运行定时任务调度器"""
-    print('定时任务调度器已启动...')
-    try:
-        import time
-        while True:
-            time.sleep(60)
-            # 刷新任务状态
-            from books.models import ScheduledTask
-            from datetime import datetime, timedelta
-            tasks = ScheduledTask.objects.filter(status='active', interval_type='interval')
-            for task in tasks:
-                if task.next_run_time and task.next_run_time < datetime.now():
-                    pass  # APScheduler会自动处理
-    except KeyboardInterrupt:
-        scheduler.shutdown()
-        print('调度器已停止')
+from books.scrapers.scheduler import start_scheduler
 
 
 def main():
@@ -40,14 +21,19 @@ def main():
     print('阅读3本地书源网站')
     print('=' * 50)
     
-    # 加载定时任务
-    print('加载定时任务...')
-    load_all_tasks()
-    
-    # 启动定时任务调度器线程
-    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
+    # 启动定时任务调度器，多个进程同时启动时只有获得主节点锁的进程执行调度
+    print('启动定时任务调度器...')
+    start_scheduler()
     
+    # 启动抓取任务 worker，任务在独立进程中执行，不占用Web进程
+    processes = os.environ.get('WORKER_PROCESSES', '2')
+    if processes != '0':
+        print(f'启动抓取任务 worker（{processes} 个进程）...')
+        subprocess.Popen(
+            [sys.executable, 'manage.py', 'worker', '--processes', processes, '--no-scheduler'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+
     # 启动Django服务
     print('启动Django服务...')
     call_command('runserver', '0.0.0.0:8000', '--noreload')